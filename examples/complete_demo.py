@@ -21,6 +21,11 @@ def print_section(title):
     print(f"{'='*60}")
 
 
+def _truncate(text, limit):
+    """超过 limit 个字符时截断并追加省略号，否则原样返回。"""
+    return text if len(text) <= limit else f"{text[:limit]}..."
+
+
 def print_result(operation, result):
     """打印操作结果"""
     status = "✅" if result['success'] else "❌"
@@ -30,8 +35,7 @@ def print_result(operation, result):
     # 显示额外信息
     if result['success']:
         if 'content' in result and result['content']:
-            content = result['content'][:100] + "..." if len(result['content']) > 100 else result['content']
-            print(f"   内容: {content}")
+            print(f"   内容: {_truncate(result['content'], 100)}")
         
         if 'files' in result:
             print(f"   文件数: {len(result['files'])}")
@@ -84,9 +88,12 @@ async def demo_file_management(agent):
     result = await agent.execute('将"demo.txt"复制为"demo_backup.txt"')
     print_result("复制文件", result)
     
-    # 3. 创建多个测试文件
-    for i in range(3):
-        result = await agent.execute(f'创建一个名为"test_{i}.txt"的文件，内容是"测试文件 {i}"')
+    # 3. 并发创建多个测试文件
+    results = await asyncio.gather(*[
+        agent.execute(f'创建一个名为"test_{i}.txt"的文件，内容是"测试文件 {i}"')
+        for i in range(3)
+    ])
+    for i, result in enumerate(results):
         print_result(f"创建测试文件 {i}", result)
     
     # 4. 再次列出文件查看变化
@@ -109,7 +116,7 @@ async def demo_ai_interaction(agent):
         print(f"🤖 用户: {command}")
         result = await agent.execute(command)
         if result['success']:
-            print(f"🤖 AI: {result['message'][:200]}...")
+            print(f"🤖 AI: {_truncate(result['message'], 200)}")
         else:
             print(f"❌ AI服务不可用: {result['message']}")
         print()
@@ -121,10 +128,9 @@ async def demo_advanced_features(agent):
     
     # 1. 显示系统状态
     status = agent.get_status()
-    print("📊 系统状态:")
-    for key, value in status.items():
-        print(f"   {key}: {value}")
-    print()
+    lines = ["📊 系统状态:"]
+    lines.extend(f"   {key}: {value}" for key, value in status.items())
+    sys.stdout.write("\n".join(lines) + "\n\n")
     
     # 2. 测试错误处理
     result = await agent.execute('读取文件"不存在的文件.txt"')
@@ -155,8 +161,11 @@ async def demo_cleanup(agent):
         "test_1.txt", "test_2.txt"
     ]
     
-    for filename in demo_files:
-        result = await agent.execute(f'删除文件"{filename}"')
+    # 各文件互不依赖，并发删除
+    results = await asyncio.gather(*[
+        agent.execute(f'删除文件"{filename}"') for filename in demo_files
+    ])
+    for filename, result in zip(demo_files, results):
         if result['success']:
             print(f"🗑️  已删除: {filename}")
     
@@ -36,12 +36,8 @@ async def demo_deepseek():
         # 创建使用DeepSeek的agent实例
         agent = FileAgent()
         
-        # 设置使用DeepSeek提供商
-        agent.config.set("ai.default_provider", "deepseek")
-        agent.config.set("ai.default_model", "deepseek-chat")
-        
-        # 重新初始化AI提供商
-        agent._setup_ai_provider()
+        # 切换到DeepSeek提供商
+        agent.switch_model("deepseek", "deepseek-chat")
         
         print(f"✅ 已切换到DeepSeek提供商")
         print(f"   模型: {agent.ai_provider.model}")
@@ -112,13 +108,13 @@ async def demo_model_comparison():
     models = ["deepseek-chat", "deepseek-coder"]
     prompt = "请用Python写一个简单的排序算法"
     
+    # 只需创建一次agent，每个模型仅切换AI提供商
+    agent = FileAgent()
+    
     for model in models:
         print(f"\n🤖 测试模型: {model}")
         try:
-            agent = FileAgent()
-            agent.config.set("ai.default_provider", "deepseek")
-            agent.config.set("ai.default_model", model)
-            agent._setup_ai_provider()
+            agent.switch_model("deepseek", model)
             
             result = await agent.execute(prompt)
             if result['success']:
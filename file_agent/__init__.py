@@ -2,17 +2,43 @@
 File Agent - A file management agent with AI capabilities.
 """
 
-from .agent import FileAgent
-from .config import Config
-from .file_manager import FileManager
-from .ai_providers import AIProviderFactory
+import importlib
+from typing import TYPE_CHECKING, Any, List
+
+if TYPE_CHECKING:
+    from .agent import FileAgent
+    from .config import Config
+    from .file_manager import FileManager
+    from .ai_providers import AIProviderFactory
 
 __version__ = "0.1.0"
 __author__ = "Your Name"
 
 __all__ = [
     "FileAgent",
-    "Config", 
+    "Config",
     "FileManager",
     "AIProviderFactory",
 ]
+
+# 公开名称到所在子模块的映射，首次访问时才导入（PEP 562）
+_LAZY_EXPORTS = {
+    "FileAgent": ".agent",
+    "Config": ".config",
+    "FileManager": ".file_manager",
+    "AIProviderFactory": ".ai_providers",
+}
+
+
+def __getattr__(name: str) -> Any:
+    module_name = _LAZY_EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    # 缓存到模块命名空间，后续访问不再经过 __getattr__
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(__all__))
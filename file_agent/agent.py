@@ -3,20 +3,529 @@ Main agent module that integrates file management and AI capabilities.
 """
 
 import asyncio
-import json
+import functools
+import itertools
+import os
 import re
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Mapping, Optional, Callable, FrozenSet, Iterator, Set, Tuple
 import logging
 
 from .config import Config
 from .file_manager import FileManager
-from .ai_providers import AIProviderFactory, AIProvider
+from .ai_providers import AIProviderFactory, AIProvider, PROVIDER_DEFAULTS
 
 logger = logging.getLogger(__name__)
 
+# 命令解析用的正则表达式，模块加载时编译一次
+_CONTENT_QUOTED_RE = re.compile(r'内容[是为]?["\']([^"\']+)["\']')
+_CONTENT_FREE_RE = re.compile(r'内容[是为]?\s*(.+)')
+
+# 参数中表示文件路径的键
+_PATH_PARAMS = ("path", "src_path", "dst_path")
+
+# 依赖目录整体状态的操作，批量执行时不与其他操作并发
+_BARRIER_OPERATIONS = frozenset({"list_files"})
+
+
+# 待执行的操作：(原始序号, 操作名, 参数字典)
+_PlannedCall = Tuple[int, str, Dict[str, Any]]
+
+# 每个批次最多拆分为多少组提交到线程池
+_BATCH_CHUNKS = 8
+
+
+def _paths_overlap(a: str, b: str) -> bool:
+    """判断两个规范化路径是否相同或存在父子关系。"""
+    return a == b or a.startswith(b + os.sep) or b.startswith(a + os.sep)
+
+
+# AI 响应中的执行指令
+_EXECUTE_MARKER = "EXECUTE:"
+
+# AI处理时附带的文件操作说明
+_FILE_OPS_INSTRUCTIONS = """你可以执行以下文件操作：
+- 创建文件：create_file(path, content)
+- 读取文件：read_file(path)
+- 写入文件：write_file(path, content, append=False)
+- 删除文件：delete_file(path)
+- 移动文件：move_file(src_path, dst_path)
+- 复制文件：copy_file(src_path, dst_path)
+- 创建目录：create_directory(path)
+- 列出文件：list_files(path, pattern="*", recursive=False)
+
+如果用户需要执行文件操作，请在回复的最后添加一行：
+EXECUTE: operation_name(param1, param2, ...)
+
+例如：
+- 如果要创建文件：EXECUTE: create_file("test.py", "print('Hello World')")
+- 如果要列出文件：EXECUTE: list_files(".", "*.py")
+
+请分析用户的需求并提供帮助。
+"""
+
+# 支持角色分离消息的提供商使用的系统提示
+_FILE_OPS_SYSTEM_PROMPT = "你是一个文件管理助手。\n\n" + _FILE_OPS_INSTRUCTIONS
+
+# 不支持系统提示时，用户输入夹在前后缀之间组成单条提示
+_PROMPT_PREFIX = '\n你是一个文件管理助手。用户说："'
+_PROMPT_SUFFIX = '"\n\n' + _FILE_OPS_INSTRUCTIONS
+
+# 支持原生工具调用的提供商使用的系统提示，操作说明由工具定义提供
+_FILE_TOOLS_SYSTEM_PROMPT = (
+    "你是一个文件管理助手。如果用户需要执行文件操作，请直接调用提供的工具，"
+    "无需用文字描述操作步骤。"
+)
+
+
+def _tool(name: str, description: str, properties: Dict[str, Dict[str, Any]],
+          required: Tuple[str, ...]) -> Dict[str, Any]:
+    """构造与提供商无关的工具定义。"""
+    return {
+        "name": name,
+        "description": description,
+        "parameters": {
+            "type": "object",
+            "properties": properties,
+            "required": list(required)
+        }
+    }
+
+
+_PATH = {"type": "string", "description": "相对于工作目录的路径"}
+_CONTENT = {"type": "string", "description": "文件内容"}
+_SRC = {"type": "string", "description": "源文件路径"}
+_DST = {"type": "string", "description": "目标文件路径"}
+
+# 文件操作的工具定义，与 FileAgent._OPERATION_NAMES 中的操作一一对应
+_FILE_OPS_TOOLS: List[Dict[str, Any]] = [
+    _tool("create_file", "创建文件", {"path": _PATH, "content": _CONTENT}, ("path",)),
+    _tool("read_file", "读取文件内容", {"path": _PATH}, ("path",)),
+    _tool("write_file", "写入文件内容", {
+        "path": _PATH,
+        "content": _CONTENT,
+        "append": {"type": "boolean", "description": "是否追加到文件末尾"}
+    }, ("path", "content")),
+    _tool("delete_file", "删除文件", {"path": _PATH}, ("path",)),
+    _tool("move_file", "移动文件", {"src_path": _SRC, "dst_path": _DST}, ("src_path", "dst_path")),
+    _tool("copy_file", "复制文件", {"src_path": _SRC, "dst_path": _DST}, ("src_path", "dst_path")),
+    _tool("create_directory", "创建目录", {"path": _PATH}, ("path",)),
+    _tool("list_files", "列出目录中的文件和子目录", {
+        "path": _PATH,
+        "pattern": {"type": "string", "description": "文件名通配符模式，默认 *"},
+        "recursive": {"type": "boolean", "description": "是否递归列出子目录"}
+    }, ()),
+]
+
+# 友好确认只用于删除、移动等改变已有文件的操作，读取和列出等操作的结果本身即可展示
+_CONFIRMATION_OPERATIONS = frozenset({"delete_file", "move_file"})
+
+# 友好确认：消息超过该长度或包含以下片段时才交给AI改写
+_REWORD_MAX_LENGTH = 120
+_REWORD_MARKERS = ("Traceback", "errno", "Errno", "/")
+
+
+def _needs_rewording(message: str) -> bool:
+    """判断文件操作消息是否需要AI改写；简短清晰的消息直接展示给用户。"""
+    if len(message) > _REWORD_MAX_LENGTH:
+        return True
+    return any(marker in message for marker in _REWORD_MARKERS)
+
+
+# 命令意图：每个命名分组对应一类同义关键词，一次扫描即可得到全部意图。
+# "文件夹" 按子串规则同时包含 "文件"，与逐个关键词判断时一样归入 file 意图：
+# "创建文件夹 'a.txt'" 创建文件，"创建文件夹 'docs'" 没有文件名时交给AI处理
+_INTENT_RE = re.compile(
+    "(?P<create>创建)"
+    "|(?P<dir>目录)"
+    "|(?P<file>文件)"
+    "|(?P<read>读取|查看)"
+    "|(?P<list>列出|显示)"
+    "|(?P<delete>删除)"
+    "|(?P<copy>复制|拷贝)"
+    "|(?P<recursive>递归)"
+    "|(?P<content>内容)"
+)
+
+
+def _find_closing_paren(text: str, start: int) -> int:
+    """
+    从 start 开始查找与已打开的左括号配对的右括号位置，没有则返回 -1。
+
+    引号内的括号不计入深度，引号内的反斜杠转义下一个字符。
+    """
+    depth = 1
+    quote = None
+    i = start
+    n = len(text)
+    while i < n:
+        c = text[i]
+        if quote:
+            if c == "\\":
+                i += 1
+            elif c == quote:
+                quote = None
+        elif c == '"' or c == "'":
+            quote = c
+        elif c == "(":
+            depth += 1
+        elif c == ")":
+            depth -= 1
+            if depth == 0:
+                return i
+        i += 1
+    return -1
+
+
+# EXECUTE 指令的位置参数签名：操作名 -> ((参数名, 默认值), ...)，默认值为 None 表示必需参数
+_OP_SIG: Dict[str, Tuple[Tuple[str, Any], ...]] = {
+    "create_file": (("path", None), ("content", "")),
+    "read_file": (("path", None),),
+    "write_file": (("path", None), ("content", None), ("append", False)),
+    "delete_file": (("path", None),),
+    "move_file": (("src_path", None), ("dst_path", None)),
+    "copy_file": (("src_path", None), ("dst_path", None)),
+    "create_directory": (("path", None),),
+    "list_files": (("path", "."), ("pattern", "*"), ("recursive", False)),
+}
+
+
+def _bind_args(operation_name: str, args: List[str]) -> Optional[Dict[str, Any]]:
+    """
+    按签名表将位置参数映射为关键字参数。
+
+    Returns:
+        参数字典；操作未知或缺少必需参数时返回 None
+    """
+    signature = _OP_SIG.get(operation_name)
+    if signature is None:
+        logger.debug("Dropped EXECUTE directive with unknown operation: %s", operation_name)
+        return None
+
+    params = {}
+    for i, (name, default) in enumerate(signature):
+        if i < len(args):
+            value: Any = args[i]
+            if isinstance(default, bool):
+                value = value.strip().lower() in ("true", "1", "yes")
+            params[name] = value
+        elif default is None:
+            logger.debug("Dropped EXECUTE directive %s: missing argument %s (got %d)",
+                         operation_name, name, len(args))
+            return None
+        else:
+            params[name] = default
+    if len(args) > len(signature):
+        logger.debug("Ignored %d extra argument(s) of EXECUTE directive %s",
+                     len(args) - len(signature), operation_name)
+    return params
+
+
+# 引号字符串中支持的转义序列，其余反斜杠按原样保留
+_ARG_ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "\\": "\\", "'": "'", '"': '"'}
+
+
+def _read_quoted(text: str, start: int) -> Tuple[str, int]:
+    """
+    读取从 start 处引号开始的字符串字面量。
+
+    Returns:
+        (解码后的内容, 右引号之后的位置)；缺少右引号时读到文本末尾
+    """
+    quote = text[start]
+    chars = []
+    i = start + 1
+    n = len(text)
+    while i < n:
+        c = text[i]
+        if c == quote:
+            return "".join(chars), i + 1
+        if c == "\\" and i + 1 < n:
+            nxt = text[i + 1]
+            chars.append(_ARG_ESCAPES.get(nxt, c + nxt))
+            i += 2
+            continue
+        chars.append(c)
+        i += 1
+    return "".join(chars), n
+
+
+def _parse_args(text: str) -> List[str]:
+    """
+    将 EXECUTE 指令的参数文本拆分为参数列表。
+
+    支持单引号和双引号字符串（含常见转义），引号内的逗号不会拆分参数；
+    相邻的字符串按 Python 字面量的规则拼接（'it''s.txt' 即 'its.txt'）；
+    未加引号的参数去除首尾空白后按原样返回。
+    """
+    args = []
+    i = 0
+    n = len(text)
+    while i < n:
+        while i < n and text[i].isspace():
+            i += 1
+        if i >= n:
+            break
+
+        if text[i] == '"' or text[i] == "'":
+            value, i = _read_quoted(text, i)
+            while True:
+                j = i
+                while j < n and text[j].isspace():
+                    j += 1
+                if j >= n or (text[j] != '"' and text[j] != "'"):
+                    break
+                more, i = _read_quoted(text, j)
+                value += more
+        else:
+            comma = text.find(",", i)
+            end = n if comma == -1 else comma
+            value = text[i:end].strip()
+            i = end
+        args.append(value)
+
+        # 跳过右引号与下一个逗号之间的多余字符
+        comma = text.find(",", i)
+        stray = text[i:n if comma == -1 else comma].strip()
+        if stray:
+            logger.debug("Ignored unexpected text after EXECUTE argument: %r", stray)
+        if comma == -1:
+            break
+        i = comma + 1
+    return args
+
+
+def _parse_execute_lines(text: str) -> Tuple[List[Tuple[str, str]], str]:
+    """
+    线性扫描AI响应中的 EXECUTE 指令，同时生成去除指令后的文本。
+
+    Returns:
+        ((操作名, 参数文本) 列表, 去除已识别指令及其所在行尾换行后的文本)；
+        缺少配对右括号的指令会被忽略并保留在文本中
+    """
+    directives = []
+    pieces = []
+    last = 0
+    n = len(text)
+    pos = text.find(_EXECUTE_MARKER)
+    while pos != -1:
+        i = pos + len(_EXECUTE_MARKER)
+        while i < n and text[i].isspace():
+            i += 1
+        name_start = i
+        while i < n and (text[i] == "_" or text[i].isalnum()):
+            i += 1
+
+        if i > name_start and i < n and text[i] == "(":
+            end = _find_closing_paren(text, i + 1)
+            if end != -1:
+                directives.append((text[name_start:i], text[i + 1:end]))
+                # 连同指令后的行尾空白和换行一起移除
+                i = end + 1
+                while i < n and text[i] in " \t\r":
+                    i += 1
+                if i < n and text[i] == "\n":
+                    i += 1
+                pieces.append(text[last:pos])
+                last = i
+            else:
+                logger.debug("Ignored EXECUTE directive without closing parenthesis: %s",
+                             text[name_start:i])
+        pos = text.find(_EXECUTE_MARKER, i)
+
+    pieces.append(text[last:])
+    return directives, "".join(pieces)
+
+
+def _find_quote(text: str, start: int) -> int:
+    """返回 start 之后第一个单引号或双引号的位置，没有则返回 -1。"""
+    double = text.find('"', start)
+    single = text.find("'", start)
+    if double == -1 or (single != -1 and single < double):
+        return single
+    return double
+
+
+def _has_extension(name: str) -> bool:
+    """判断名称是否以 `.扩展名` 结尾（扩展名由字母、数字或下划线组成）。"""
+    head, _, ext = name.rpartition(".")
+    return bool(head) and bool(ext) and all(c == "_" or c.isalnum() for c in ext)
+
+
+def _iter_quoted(text: str, need_ext: bool = True) -> Iterator[str]:
+    """
+    依次产出引号包围的非空片段，与正则 ["']([^"']+)["'] 的扫描方式一致。
+
+    Args:
+        text: 待扫描的文本
+        need_ext: 是否只产出带扩展名的片段（用于提取文件名）
+    """
+    start = _find_quote(text, 0)
+    while start != -1:
+        end = _find_quote(text, start + 1)
+        if end == -1:
+            return
+        inner = text[start + 1:end]
+        if inner and (not need_ext or _has_extension(inner)):
+            yield inner
+            start = _find_quote(text, end + 1)
+        else:
+            # 右引号可能是下一个片段的左引号
+            start = end
+
+
+def _first_quoted(text: str, need_ext: bool = True) -> Optional[str]:
+    """返回第一个引号包围的片段，没有则返回 None。"""
+    return next(_iter_quoted(text, need_ext), None)
+
+
+def _parse_create_file(text: str, intents: Set[str]) -> Optional[Dict[str, Any]]:
+    """解析文件创建命令。"""
+    # 提取引号中的文件名
+    filename = _first_quoted(text)
+    if not filename:
+        return None
+
+    # 提取内容 - 改进的内容提取逻辑
+    content = ""
+
+    # 方法1: 查找"内容是/为"模式
+    if "content" in intents:
+        content_match = _CONTENT_QUOTED_RE.search(text)
+        content = content_match.group(1) if content_match else ""
+
+    # 方法2: 查找文件名后的内容描述
+    if not content:
+        # 查找类似"内容是print('Hello')"的模式
+        content_match = _CONTENT_FREE_RE.search(text)
+        if content_match:
+            content_part = content_match.group(1).strip()
+            # 移除引号
+            if content_part.startswith('"') and content_part.endswith('"'):
+                content = content_part[1:-1]
+            elif content_part.startswith("'") and content_part.endswith("'"):
+                content = content_part[1:-1]
+            else:
+                content = content_part
+
+    return {
+        "operation": "create_file",
+        "params": {"path": filename, "content": content}
+    }
+
+
+def _parse_create_directory(text: str, intents: Set[str]) -> Optional[Dict[str, Any]]:
+    """解析目录创建命令。"""
+    # 提取引号中的目录名
+    dirname = _first_quoted(text, need_ext=False)
+    if not dirname:
+        return None
+    return {
+        "operation": "create_directory",
+        "params": {"path": dirname}
+    }
+
+
+def _parse_read_file(text: str, intents: Set[str]) -> Optional[Dict[str, Any]]:
+    """解析文件读取命令。"""
+    filename = _first_quoted(text)
+    if not filename:
+        return None
+    return {
+        "operation": "read_file",
+        "params": {"path": filename}
+    }
+
+
+def _parse_list_files(text: str, intents: Set[str]) -> Optional[Dict[str, Any]]:
+    """解析文件列表命令。"""
+    return {
+        "operation": "list_files",
+        "params": {"path": ".", "recursive": "recursive" in intents}
+    }
+
+
+def _parse_delete_file(text: str, intents: Set[str]) -> Optional[Dict[str, Any]]:
+    """解析文件删除命令。"""
+    filename = _first_quoted(text)
+    if not filename:
+        return None
+    return {
+        "operation": "delete_file",
+        "params": {"path": filename}
+    }
+
+
+def _parse_copy_file(text: str, intents: Set[str]) -> Optional[Dict[str, Any]]:
+    """解析文件复制命令。"""
+    # 匹配两个文件名
+    file_matches = list(itertools.islice(_iter_quoted(text), 2))
+    if len(file_matches) < 2:
+        return None
+    return {
+        "operation": "copy_file",
+        "params": {"src_path": file_matches[0], "dst_path": file_matches[1]}
+    }
+
+
+# 命令规则：按优先级排列，每条规则要求其中的意图全部出现
+_CommandParser = Callable[[str, Set[str]], Optional[Dict[str, Any]]]
+_COMMAND_RULES: Tuple[Tuple[FrozenSet[str], _CommandParser], ...] = (
+    (frozenset({"create", "file"}), _parse_create_file),
+    (frozenset({"create", "dir"}), _parse_create_directory),
+    (frozenset({"read"}), _parse_read_file),
+    (frozenset({"list"}), _parse_list_files),
+    (frozenset({"delete"}), _parse_delete_file),
+    (frozenset({"copy"}), _parse_copy_file),
+)
+
+
+@functools.lru_cache(maxsize=512)
+def _parse_command_cached(text: str) -> Tuple[str, Tuple[Tuple[str, Any], ...]]:
+    """
+    解析已去除首尾空白的命令文本，结果按输入缓存。
+
+    解析只依赖输入文本，重复的命令直接命中缓存；返回不可变的
+    (操作名, 参数项) 元组，避免调用方修改缓存内容。
+    """
+    # 一次扫描收集出现的意图，再按优先级匹配命令规则
+    intents = {match.lastgroup for match in _INTENT_RE.finditer(text)}
+    for required, parser in _COMMAND_RULES:
+        if required <= intents:
+            command = parser(text, intents)
+            if command:
+                return command["operation"], tuple(command["params"].items())
+            break
+
+    # 默认返回AI处理命令
+    return "ai_process", (("prompt", text),)
+
 
 class FileAgent:
     """文件管理智能代理主类。"""
+
+    __slots__ = (
+        "config",
+        "file_manager",
+        "ai_provider",
+        "_fm_config",
+        "_friendly_confirmations",
+        "_ai_gen_kwargs",
+        "_ai_meta",
+        "_http_client",
+    )
+
+    # 可用的文件操作，与 FileManager 的同名方法对应；按展示顺序排列
+    _OPERATION_NAMES: Tuple[str, ...] = (
+        "create_file",
+        "read_file",
+        "write_file",
+        "delete_file",
+        "move_file",
+        "copy_file",
+        "create_directory",
+        "list_files",
+    )
+    _OPERATIONS: FrozenSet[str] = frozenset(_OPERATION_NAMES)
     
     def __init__(self, config_file: Optional[str] = None):
         """
@@ -30,30 +539,74 @@ class FileAgent:
         # 验证配置
         validation = self.config.validate_config()
         if not validation["valid"]:
-            logger.warning(f"Configuration issues: {validation['issues']}")
+            logger.warning("Configuration issues: %s", validation['issues'])
         
-        # 初始化文件管理器
-        fm_config = self.config.get_file_manager_config()
+        # 初始化文件管理器；文件管理器配置缓存在代理上，供 get_status 使用
+        self._fm_config = self.config.get_file_manager_config()
         self.file_manager = FileManager(
-            workspace=fm_config["workspace"],
-            backup_enabled=fm_config["backup_enabled"]
+            workspace=self._fm_config["workspace"],
+            backup_enabled=self._fm_config["backup_enabled"]
         )
         
-        # 初始化AI提供商
+        # 文件操作成功后是否额外调用AI生成友好的确认消息（默认关闭，避免多一次网络往返）
+        self._friendly_confirmations = self._read_friendly_confirmations()
+        
+        # 初始化AI提供商；生成参数和提供商信息在设置成功后缓存
         self.ai_provider = None
+        # 该代理创建的所有AI提供商共享的HTTP连接池，首次创建提供商时建立
+        self._http_client = None
+        self._ai_gen_kwargs: Dict[str, Any] = {}
+        self._ai_meta: Optional[Tuple[str, str]] = None
         self._setup_ai_provider()
-        
-        # 定义可用的文件操作
-        self.file_operations = {
-            "create_file": self.file_manager.create_file,
-            "read_file": self.file_manager.read_file,
-            "write_file": self.file_manager.write_file,
-            "delete_file": self.file_manager.delete_file,
-            "move_file": self.file_manager.move_file,
-            "copy_file": self.file_manager.copy_file,
-            "create_directory": self.file_manager.create_directory,
-            "list_files": self.file_manager.list_files,
+    
+    def _read_friendly_confirmations(self) -> bool:
+        """读取友好确认开关，兼容环境变量中的字符串取值。"""
+        friendly = self.config.get("ai.friendly_confirmations", False)
+        if isinstance(friendly, str):
+            friendly = friendly.strip().lower() in ("1", "true", "yes", "on")
+        return bool(friendly)
+
+    @staticmethod
+    def _generation_kwargs(ai_config: Mapping[str, Any]) -> Dict[str, Any]:
+        """从AI配置中提取每次请求使用的生成参数。"""
+        return {
+            "max_tokens": ai_config["max_tokens"],
+            "temperature": ai_config["temperature"]
         }
+
+    def invalidate_config_cache(self) -> None:
+        """
+        在配置被外部修改或重新加载后刷新代理缓存的配置项。
+
+        文件管理器和AI提供商不会重建，切换提供商或模型请使用 switch_model。
+        """
+        self._fm_config = self.config.get_file_manager_config()
+        self._friendly_confirmations = self._read_friendly_confirmations()
+        if self.ai_provider:
+            self._ai_gen_kwargs = self._generation_kwargs(self.config.get_ai_config())
+
+    def switch_model(self, provider: Optional[str] = None, model: Optional[str] = None) -> None:
+        """
+        切换AI提供商和/或模型，只重建AI提供商，配置和文件管理器保持不变。
+
+        Args:
+            provider: 新的AI提供商名称（可选）
+            model: 新的模型名称（可选）
+        """
+        if provider:
+            self.config.set("ai.default_provider", provider)
+        if model:
+            self.config.set("ai.default_model", model)
+        self._setup_ai_provider()
+    
+    @property
+    def file_operations(self) -> Dict[str, Callable[..., Dict[str, Any]]]:
+        """操作名到当前文件管理器同名方法的映射，每次访问重新生成，修改它不影响代理。"""
+        return {name: getattr(self.file_manager, name) for name in self._OPERATION_NAMES}
+
+    def _get_operation(self, name: str) -> Optional[Callable[..., Dict[str, Any]]]:
+        """获取当前文件管理器上与操作名对应的方法，未知操作返回 None。"""
+        return getattr(self.file_manager, name) if name in self._OPERATIONS else None
     
     def _setup_ai_provider(self) -> None:
         """设置AI提供商。"""
@@ -63,44 +616,36 @@ class FileAgent:
             api_key = ai_config["api_keys"].get(provider_name)
 
             if not api_key:
-                logger.error(f"No API key found for provider: {provider_name}")
+                logger.error("No API key found for provider: %s", provider_name)
                 return
 
             # 根据提供商选择合适的默认模型
             model = ai_config["model"]
 
-            # 如果当前模型不适合选定的提供商，使用提供商的默认模型
-            provider_default_models = {
-                "openai": "gpt-3.5-turbo",
-                "anthropic": "claude-3-sonnet-20240229",
-                "google": "gemini-pro",
-                "deepseek": "deepseek-chat"
-            }
-
-            # 检查当前模型是否适合当前提供商
-            if provider_name in provider_default_models:
-                # 创建临时提供商实例来获取可用模型列表
-                temp_provider = AIProviderFactory.create_provider(
-                    provider_name=provider_name,
-                    api_key=api_key,
-                    model=provider_default_models[provider_name]
-                )
-                available_models = temp_provider.get_available_models()
+            # 检查当前模型是否适合当前提供商，不适合时使用提供商的默认模型
+            if provider_name in PROVIDER_DEFAULTS:
+                # 直接从提供商类读取可用模型列表，无需创建临时实例
+                provider_class = AIProviderFactory.get_provider_class(provider_name)
 
                 # 如果当前模型不在可用模型列表中，使用默认模型
-                if model not in available_models:
-                    model = provider_default_models[provider_name]
-                    logger.info(f"Switched to default model {model} for provider {provider_name}")
+                if model not in provider_class.AVAILABLE_MODELS:
+                    model = PROVIDER_DEFAULTS[provider_name]
+                    logger.info("Switched to default model %s for provider %s", model, provider_name)
 
+            if self._http_client is None:
+                self._http_client = AIProviderFactory.create_http_client()
             self.ai_provider = AIProviderFactory.create_provider(
                 provider_name=provider_name,
                 api_key=api_key,
-                model=model
+                model=model,
+                http_client=self._http_client
             )
+            self._ai_gen_kwargs = self._generation_kwargs(ai_config)
+            self._ai_meta = (provider_name, model)
 
-            logger.info(f"Initialized AI provider: {provider_name} with model: {model}")
+            logger.info("Initialized AI provider: %s with model: %s", provider_name, model)
         except Exception as e:
-            logger.error(f"Failed to setup AI provider: {e}")
+            logger.error("Failed to setup AI provider: %s", e)
     
     def _parse_command(self, user_input: str) -> Dict[str, Any]:
         """
@@ -113,95 +658,100 @@ class FileAgent:
             解析后的命令字典
         """
         # 简单的命令解析逻辑（可以扩展为更复杂的NLP解析）
-        original_input = user_input.strip()
-        user_input = user_input.lower().strip()
-
-        # 文件创建命令
-        if "创建" in user_input and "文件" in user_input:
-            # 提取引号中的文件名
-            file_match = re.search(r'["\']([^"\']+\.[\w]+)["\']', original_input)
-            if file_match:
-                filename = file_match.group(1)
-                # 提取内容 - 改进的内容提取逻辑
-                content = ""
-
-                # 方法1: 查找"内容是/为"模式
-                if "内容" in user_input:
-                    content_match = re.search(r'内容[是为]?["\']([^"\']+)["\']', original_input)
-                    content = content_match.group(1) if content_match else ""
-
-                # 方法2: 查找文件名后的内容描述
-                if not content:
-                    # 查找类似"内容是print('Hello')"的模式
-                    content_match = re.search(r'内容[是为]?\s*(.+)', original_input)
-                    if content_match:
-                        content_part = content_match.group(1).strip()
-                        # 移除引号
-                        if content_part.startswith('"') and content_part.endswith('"'):
-                            content = content_part[1:-1]
-                        elif content_part.startswith("'") and content_part.endswith("'"):
-                            content = content_part[1:-1]
-                        else:
-                            content = content_part
+        # 关键词均为中文，不受大小写影响，无需额外生成小写副本
+        operation, params = _parse_command_cached(user_input.strip())
+        return {
+            "operation": operation,
+            "params": dict(params)
+        }
 
-                return {
-                    "operation": "create_file",
-                    "params": {"path": filename, "content": content}
-                }
+    def _operation_paths(self, params: Dict[str, Any]) -> List[str]:
+        """返回操作涉及的规范化绝对路径，用于判断操作之间是否冲突。"""
+        workspace = str(self.file_manager.workspace)
+        return [
+            os.path.normpath(os.path.join(workspace, params[key]))
+            for key in _PATH_PARAMS
+            if isinstance(params.get(key), str)
+        ]
 
-        elif "创建" in user_input and ("目录" in user_input or "文件夹" in user_input):
-            # 提取引号中的目录名
-            dir_match = re.search(r'["\']([^"\']+)["\']', original_input)
-            if dir_match:
-                dirname = dir_match.group(1)
-                return {
-                    "operation": "create_directory",
-                    "params": {"path": dirname}
-                }
+    def _batch_operations(self, calls: List[_PlannedCall]) -> List[List[_PlannedCall]]:
+        """
+        将操作按原有顺序切分为互不冲突的批次。
 
-        # 文件读取命令
-        elif "读取" in user_input or "查看" in user_input:
-            file_match = re.search(r'["\']([^"\']+\.[\w]+)["\']', original_input)
-            if file_match:
-                filename = file_match.group(1)
-                return {
-                    "operation": "read_file",
-                    "params": {"path": filename}
-                }
+        同一批次内的操作不涉及相同路径或父子路径，可以并发执行；
+        列出目录等依赖整体状态的操作以及无法确定路径的操作单独成批。
+        """
+        batches = []
+        batch: List[_PlannedCall] = []
+        batch_paths: List[str] = []
+
+        for call in calls:
+            _, operation_name, params = call
+            paths = self._operation_paths(params)
+            if operation_name in _BARRIER_OPERATIONS or not paths:
+                if batch:
+                    batches.append(batch)
+                batches.append([call])
+                batch, batch_paths = [], []
+                continue
+
+            if any(_paths_overlap(a, b) for a in paths for b in batch_paths):
+                batches.append(batch)
+                batch, batch_paths = [], []
+            batch.append(call)
+            batch_paths.extend(paths)
+
+        if batch:
+            batches.append(batch)
+        return batches
+
+    async def _run_operations(self, calls: List[Tuple[str, Any]]) -> List[str]:
+        """
+        执行一组文件操作，互不冲突的操作在线程池中并发执行。
 
-        # 文件列表命令
-        elif "列出" in user_input or "显示" in user_input:
-            return {
-                "operation": "list_files",
-                "params": {"path": ".", "recursive": "递归" in user_input}
-            }
+        每个批次拆分为至多 _BATCH_CHUNKS 组，每组通过 FileManager.batch_apply
+        在一次线程池提交中完成，避免为每个操作单独调度。
 
-        # 文件删除命令
-        elif "删除" in user_input:
-            file_match = re.search(r'["\']([^"\']+\.[\w]+)["\']', original_input)
-            if file_match:
-                filename = file_match.group(1)
-                return {
-                    "operation": "delete_file",
-                    "params": {"path": filename}
-                }
+        Args:
+            calls: (操作名, 参数字典) 列表
 
-        # 文件复制命令
-        elif "复制" in user_input or "拷贝" in user_input:
-            # 匹配两个文件名
-            file_matches = re.findall(r'["\']([^"\']+\.[\w]+)["\']', original_input)
-            if len(file_matches) >= 2:
-                return {
-                    "operation": "copy_file",
-                    "params": {"src_path": file_matches[0], "dst_path": file_matches[1]}
-                }
+        Returns:
+            与 calls 一一对应的执行摘要
+        """
+        summaries = [""] * len(calls)
+        runnable: List[_PlannedCall] = []
+        for index, (operation_name, params) in enumerate(calls):
+            if operation_name not in self._OPERATIONS:
+                summaries[index] = f"✗ {operation_name}: Unknown operation"
+            elif not isinstance(params, dict):
+                summaries[index] = f"✗ {operation_name}: Error - invalid arguments"
+            else:
+                runnable.append((index, operation_name, params))
+
+        loop = asyncio.get_running_loop()
+        for batch in self._batch_operations(runnable):
+            count = min(len(batch), _BATCH_CHUNKS)
+            chunks = [batch[i::count] for i in range(count)]
+            chunk_results = await asyncio.gather(*(
+                loop.run_in_executor(
+                    None,
+                    self.file_manager.batch_apply,
+                    [(operation_name, params) for _, operation_name, params in chunk]
+                )
+                for chunk in chunks
+            ))
+            for chunk, results in zip(chunks, chunk_results):
+                for (index, operation_name, _), op_result in zip(chunk, results):
+                    if not op_result.get("success"):
+                        summary = f"✗ {operation_name}: {op_result['message']}"
+                    elif operation_name == "list_files":
+                        summary = f"✓ {operation_name}: Found {op_result.get('total_files', 0)} files"
+                    else:
+                        summary = f"✓ {operation_name}: {op_result['message']}"
+                    summaries[index] = summary
+
+        return summaries
 
-        # 默认返回AI处理命令
-        return {
-            "operation": "ai_process",
-            "params": {"prompt": original_input}
-        }
-    
     async def execute(self, user_input: str) -> Dict[str, Any]:
         """
         执行用户命令。
@@ -218,19 +768,30 @@ class FileAgent:
             operation = command["operation"]
             params = command["params"]
             
-            logger.info(f"Executing operation: {operation} with params: {params}")
+            logger.info("Executing operation: %s with params: %s", operation, params)
             
             # 执行文件操作
-            if operation in self.file_operations:
-                result = self.file_operations[operation](**params)
+            file_operation = self._get_operation(operation)
+            if file_operation:
+                # 文件操作是阻塞I/O，放到线程池执行，避免阻塞事件循环
+                loop = asyncio.get_running_loop()
+                result = await loop.run_in_executor(
+                    None, functools.partial(file_operation, **params)
+                )
                 
-                # 如果操作成功，可以选择性地使用AI生成更友好的响应
-                if result["success"] and self.ai_provider:
-                    ai_prompt = f"用户执行了文件操作：{operation}，结果：{result['message']}。请生成一个简洁友好的确认消息。"
-                    ai_response = await self.ai_provider.generate_response(ai_prompt, max_tokens=100)
-                    
-                    if ai_response["success"]:
-                        result["ai_message"] = ai_response["response"]
+                # 如果操作成功且启用了友好确认，使用AI生成更友好的响应；
+                # 消息本身已足够清晰时直接复用，省去一次API调用
+                if (result["success"] and self.ai_provider and self._friendly_confirmations
+                        and operation in _CONFIRMATION_OPERATIONS):
+                    message = result["message"]
+                    if _needs_rewording(message):
+                        ai_prompt = f"用户执行了文件操作：{operation}，结果：{message}。请生成一个简洁友好的确认消息。"
+                        ai_response = await self.ai_provider.generate_response(ai_prompt, max_tokens=100)
+                        
+                        if ai_response["success"]:
+                            result["ai_message"] = ai_response["response"]
+                    else:
+                        result["ai_message"] = message
                 
                 return result
             
@@ -243,36 +804,21 @@ class FileAgent:
                         "operation": operation
                     }
 
-                # 构建包含文件操作能力的提示
-                enhanced_prompt = f"""
-你是一个文件管理助手。用户说："{params['prompt']}"
-
-你可以执行以下文件操作：
-- 创建文件：create_file(path, content)
-- 读取文件：read_file(path)
-- 写入文件：write_file(path, content, append=False)
-- 删除文件：delete_file(path)
-- 移动文件：move_file(src_path, dst_path)
-- 复制文件：copy_file(src_path, dst_path)
-- 创建目录：create_directory(path)
-- 列出文件：list_files(path, pattern="*", recursive=False)
-
-如果用户需要执行文件操作，请在回复的最后添加一行：
-EXECUTE: operation_name(param1, param2, ...)
-
-例如：
-- 如果要创建文件：EXECUTE: create_file("test.py", "print('Hello World')")
-- 如果要列出文件：EXECUTE: list_files(".", "*.py")
-
-请分析用户的需求并提供帮助。
-"""
-
-                ai_config = self.config.get_ai_config()
-                ai_response = await self.ai_provider.generate_response(
-                    enhanced_prompt,
-                    max_tokens=ai_config["max_tokens"],
-                    temperature=ai_config["temperature"]
-                )
+                # 支持工具调用的提供商直接返回结构化的操作；其余情况下
+                # 静态的文件操作说明作为系统提示发送，便于提供商缓存；
+                # 不支持系统提示的提供商退回到单条拼接提示
+                gen_kwargs = dict(self._ai_gen_kwargs)
+                if self.ai_provider.supports_tools:
+                    prompt = params["prompt"]
+                    gen_kwargs["system"] = _FILE_TOOLS_SYSTEM_PROMPT
+                    gen_kwargs["tools"] = _FILE_OPS_TOOLS
+                elif self.ai_provider.supports_system_prompt:
+                    prompt = params["prompt"]
+                    gen_kwargs["system"] = _FILE_OPS_SYSTEM_PROMPT
+                else:
+                    prompt = f"{_PROMPT_PREFIX}{params['prompt']}{_PROMPT_SUFFIX}"
+
+                ai_response = await self.ai_provider.generate_response(prompt, **gen_kwargs)
 
                 if not ai_response["success"]:
                     return {
@@ -283,77 +829,40 @@ EXECUTE: operation_name(param1, param2, ...)
                         "usage": ai_response.get("usage")
                     }
 
+                # 模型通过工具调用给出操作时，在本次调用中直接执行
+                tool_calls = ai_response.get("tool_calls")
+                if tool_calls:
+                    executed_operations = await self._run_operations(
+                        [(call["name"], call["arguments"]) for call in tool_calls]
+                    )
+                    parts = [ai_response.get("response") or ""]
+                    parts.append("执行的操作：\n" + "\n".join(executed_operations))
+                    return {
+                        "success": True,
+                        "message": "\n\n".join(part for part in parts if part).strip(),
+                        "operation": operation,
+                        "ai_model": ai_response.get("model"),
+                        "usage": ai_response.get("usage"),
+                        "executed_operations": executed_operations
+                    }
+
                 # 解析AI响应中的执行指令
-                response_text = ai_response.get("response", "")
-                executed_operations = []
-
-                # 查找EXECUTE指令
-                import re
-                execute_pattern = r'EXECUTE:\s*(\w+)\((.*?)\)(?:\s|$)'
-                matches = re.findall(execute_pattern, response_text, re.DOTALL)
-
-                for operation_name, params_str in matches:
-                    if operation_name in self.file_operations:
-                        try:
-                            # 更好的参数解析
-                            params_list = []
-                            if params_str.strip():
-                                # 使用eval来安全解析参数（仅限于简单的字符串和数字）
-                                try:
-                                    # 构建一个安全的参数列表
-                                    params_str = params_str.strip()
-                                    if params_str.startswith('"') and '", "' in params_str:
-                                        # 处理多个字符串参数
-                                        parts = params_str.split('", "')
-                                        params_list = [part.strip('"') for part in parts]
-                                    elif params_str.startswith('"') and params_str.endswith('"'):
-                                        # 单个字符串参数
-                                        params_list = [params_str.strip('"')]
-                                    else:
-                                        # 尝试分割逗号分隔的参数
-                                        import ast
-                                        params_list = ast.literal_eval(f"[{params_str}]")
-                                except:
-                                    # 如果解析失败，尝试简单的字符串分割
-                                    params_list = [p.strip().strip('"\'') for p in params_str.split(',')]
-
-                            # 执行操作
-                            if operation_name == "create_file" and len(params_list) >= 1:
-                                path = params_list[0]
-                                content = params_list[1] if len(params_list) > 1 else ""
-                                op_result = self.file_operations[operation_name](path, content)
-                                executed_operations.append(f"✓ {operation_name}: {op_result['message']}")
-
-                            elif operation_name == "list_files":
-                                path = params_list[0] if params_list else "."
-                                pattern = params_list[1] if len(params_list) > 1 else "*"
-                                op_result = self.file_operations[operation_name](path, pattern)
-                                executed_operations.append(f"✓ {operation_name}: Found {op_result.get('total_files', 0)} files")
-
-                            elif operation_name in ["read_file", "delete_file"] and len(params_list) >= 1:
-                                path = params_list[0]
-                                op_result = self.file_operations[operation_name](path)
-                                executed_operations.append(f"✓ {operation_name}: {op_result['message']}")
-
-                            elif operation_name in ["move_file", "copy_file"] and len(params_list) >= 2:
-                                src_path = params_list[0]
-                                dst_path = params_list[1]
-                                op_result = self.file_operations[operation_name](src_path, dst_path)
-                                executed_operations.append(f"✓ {operation_name}: {op_result['message']}")
-
-                            elif operation_name == "create_directory" and len(params_list) >= 1:
-                                path = params_list[0]
-                                op_result = self.file_operations[operation_name](path)
-                                executed_operations.append(f"✓ {operation_name}: {op_result['message']}")
-
-                        except Exception as e:
-                            executed_operations.append(f"✗ {operation_name}: Error - {str(e)}")
+                response_text = ai_response.get("response") or ""
+
+                # 查找EXECUTE指令；先解析全部指令，再批量执行
+                directives, remaining_text = _parse_execute_lines(response_text)
+                calls = []
+                for operation_name, params_str in directives:
+                    params = _bind_args(operation_name, _parse_args(params_str))
+                    if params is not None:
+                        calls.append((operation_name, params))
+                executed_operations = await self._run_operations(calls)
 
                 # 构建最终响应
                 final_message = response_text
                 if executed_operations:
-                    # 移除EXECUTE指令行
-                    final_message = re.sub(r'EXECUTE:.*?\n?', '', final_message).strip()
+                    # 使用扫描时已去除EXECUTE指令的文本
+                    final_message = remaining_text.strip()
                     final_message += "\n\n执行的操作：\n" + "\n".join(executed_operations)
 
                 return {
@@ -373,22 +882,33 @@ EXECUTE: operation_name(param1, param2, ...)
                 }
         
         except Exception as e:
-            logger.error(f"Error executing command '{user_input}': {e}")
+            logger.error("Error executing command '%s': %s", user_input, e, exc_info=True)
             return {
                 "success": False,
                 "message": f"Error executing command: {str(e)}",
                 "operation": "unknown"
             }
     
+    async def aclose(self) -> None:
+        """关闭AI提供商共享的连接池，应在执行命令的同一个事件循环中、代理不再使用时调用。"""
+        if self.ai_provider:
+            await self.ai_provider.aclose()
+        http_client, self._http_client = self._http_client, None
+        if http_client is not None:
+            await http_client.aclose()
+
     def get_status(self) -> Dict[str, Any]:
         """获取代理状态信息。"""
-        ai_config = self.config.get_ai_config()
-        fm_config = self.config.get_file_manager_config()
+        fm_config = self._fm_config
+        if self.ai_provider and self._ai_meta:
+            provider_name, model = self._ai_meta
+        else:
+            provider_name, model = "Not configured", "N/A"
         
         return {
-            "ai_provider": ai_config["provider"] if self.ai_provider else "Not configured",
-            "ai_model": ai_config["model"] if self.ai_provider else "N/A",
+            "ai_provider": provider_name,
+            "ai_model": model,
             "workspace": fm_config["workspace"],
             "backup_enabled": fm_config["backup_enabled"],
-            "available_operations": list(self.file_operations.keys())
+            "available_operations": list(self._OPERATION_NAMES)
         }
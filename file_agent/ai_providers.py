@@ -4,38 +4,150 @@ AI providers module for integrating with different AI APIs.
 
 import asyncio
 from abc import ABC, abstractmethod
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple, Type
 import logging
 
+from .config import _json_loads
+
+try:
+    # httpx 随 openai/anthropic SDK 一起安装；缺失时各 SDK 客户端使用自己的连接池
+    import httpx
+except ImportError:
+    httpx = None
+
 logger = logging.getLogger(__name__)
 
+# SDK 模块在首次创建对应提供商时导入并缓存，未使用的提供商不产生导入开销
+_openai: Any = None
+_anthropic: Any = None
+_genai: Any = None
+
+
+def _get_openai() -> Any:
+    """导入并缓存 openai 模块。"""
+    global _openai
+    if _openai is None:
+        import openai
+        _openai = openai
+    return _openai
+
+
+def _get_anthropic() -> Any:
+    """导入并缓存 anthropic 模块。"""
+    global _anthropic
+    if _anthropic is None:
+        import anthropic
+        _anthropic = anthropic
+    return _anthropic
+
+
+def _get_genai() -> Any:
+    """导入并缓存 google.generativeai 模块。"""
+    global _genai
+    if _genai is None:
+        import google.generativeai as genai
+        _genai = genai
+    return _genai
+
+
+def _openai_tools(tools: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """将通用工具定义转换为 OpenAI 兼容的 function 工具格式。"""
+    return [{"type": "function", "function": tool} for tool in tools]
+
+
+def _openai_tool_calls(message: Any) -> List[Dict[str, Any]]:
+    """从 OpenAI 兼容的响应消息中提取工具调用。"""
+    tool_calls = []
+    for call in message.tool_calls or ():
+        try:
+            arguments = _json_loads(call.function.arguments or "{}")
+        except ValueError:
+            logger.warning("Invalid tool arguments for %s: %s", call.function.name, call.function.arguments)
+            arguments = {}
+        tool_calls.append({"name": call.function.name, "arguments": arguments})
+    return tool_calls
+
 
 class AIProvider(ABC):
     """AI提供商的抽象基类。"""
+
+    __slots__ = ("api_key", "model", "_http_client")
+
+    # 是否支持通过 system 参数单独发送系统提示
+    supports_system_prompt = False
+
+    # 是否支持通过 tools 参数进行原生工具调用
+    supports_tools = False
+
+    # 可用的模型列表（按展示顺序）
+    AVAILABLE_MODELS: Tuple[str, ...] = ()
     
-    def __init__(self, api_key: str, model: str):
+    def __init__(self, api_key: str, model: str, http_client: Optional["httpx.AsyncClient"] = None):
         self.api_key = api_key
         self.model = model
+        # 调用方传入的共享HTTP客户端，由调用方负责关闭
+        self._http_client = http_client
     
     @abstractmethod
     async def generate_response(self, prompt: str, **kwargs) -> Dict[str, Any]:
-        """生成AI响应。"""
+        """
+        生成AI响应。
+
+        Args:
+            prompt: 用户提示
+            **kwargs: 生成参数，如 max_tokens、temperature；
+                支持系统提示的提供商还接受 system，
+                支持工具调用的提供商还接受 tools（name/description/parameters 字典列表）
+
+        Returns:
+            响应结果字典；模型发起工具调用时包含 tool_calls
+            （name/arguments 字典列表）
+        """
         pass
     
-    @abstractmethod
-    def get_available_models(self) -> List[str]:
-        """获取可用的模型列表。"""
-        pass
+    async def aclose(self) -> None:
+        """
+        关闭提供商客户端持有的连接池。
+
+        SDK 客户端自己创建的连接池绑定在首次使用它的事件循环上，不再使用提供商时
+        应在同一个事件循环中调用。使用共享HTTP客户端的提供商不关闭它，由创建方负责；
+        没有可关闭客户端的提供商什么也不做。
+        """
+        if self._http_client is not None:
+            return
+        close = getattr(getattr(self, "client", None), "close", None)
+        if close is not None and asyncio.iscoroutinefunction(close):
+            await close()
+
+    @classmethod
+    def get_available_models(cls) -> Tuple[str, ...]:
+        """获取可用的模型列表，无需创建实例；返回共享的不可变元组。"""
+        return cls.AVAILABLE_MODELS
 
 
 class OpenAIProvider(AIProvider):
     """OpenAI API提供商。"""
+
+    __slots__ = ("client",)
+
+    supports_system_prompt = True
+    supports_tools = True
+    AVAILABLE_MODELS = (
+        "gpt-4",
+        "gpt-4-turbo-preview",
+        "gpt-3.5-turbo",
+        "gpt-3.5-turbo-16k",
+    )
     
-    def __init__(self, api_key: str, model: str = "gpt-3.5-turbo"):
-        super().__init__(api_key, model)
+    def __init__(self, api_key: str, model: str = "gpt-3.5-turbo",
+                 http_client: Optional["httpx.AsyncClient"] = None):
+        super().__init__(api_key, model, http_client)
         try:
-            import openai
-            self.client = openai.OpenAI(api_key=api_key)
+            openai = _get_openai()
+            self.client = openai.AsyncOpenAI(
+                api_key=api_key,
+                http_client=http_client
+            )
         except ImportError:
             raise ImportError("openai package is required for OpenAI provider")
     
@@ -45,16 +157,27 @@ class OpenAIProvider(AIProvider):
             max_tokens = kwargs.get('max_tokens', 1000)
             temperature = kwargs.get('temperature', 0.7)
             
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=max_tokens,
-                temperature=temperature
-            )
+            messages = [{"role": "user", "content": prompt}]
+            system = kwargs.get('system')
+            if system:
+                messages.insert(0, {"role": "system", "content": system})
+
+            request = {
+                "model": self.model,
+                "messages": messages,
+                "max_tokens": max_tokens,
+                "temperature": temperature
+            }
+            tools = kwargs.get('tools')
+            if tools:
+                request["tools"] = _openai_tools(tools)
+
+            response = await self.client.chat.completions.create(**request)
+            message = response.choices[0].message
             
-            return {
+            result = {
                 "success": True,
-                "response": response.choices[0].message.content,
+                "response": message.content,
                 "model": self.model,
                 "usage": {
                     "prompt_tokens": response.usage.prompt_tokens,
@@ -62,32 +185,40 @@ class OpenAIProvider(AIProvider):
                     "total_tokens": response.usage.total_tokens
                 }
             }
+            if tools:
+                result["tool_calls"] = _openai_tool_calls(message)
+            return result
         except Exception as e:
-            logger.error(f"OpenAI API error: {e}")
+            logger.error("OpenAI API error: %s", e)
             return {
                 "success": False,
                 "error": str(e),
                 "model": self.model
             }
-    
-    def get_available_models(self) -> List[str]:
-        """获取OpenAI可用的模型列表。"""
-        return [
-            "gpt-4",
-            "gpt-4-turbo-preview",
-            "gpt-3.5-turbo",
-            "gpt-3.5-turbo-16k"
-        ]
 
 
 class AnthropicProvider(AIProvider):
     """Anthropic Claude API提供商。"""
+
+    __slots__ = ("client",)
+
+    supports_system_prompt = True
+    supports_tools = True
+    AVAILABLE_MODELS = (
+        "claude-3-opus-20240229",
+        "claude-3-sonnet-20240229",
+        "claude-3-haiku-20240307",
+    )
     
-    def __init__(self, api_key: str, model: str = "claude-3-sonnet-20240229"):
-        super().__init__(api_key, model)
+    def __init__(self, api_key: str, model: str = "claude-3-sonnet-20240229",
+                 http_client: Optional["httpx.AsyncClient"] = None):
+        super().__init__(api_key, model, http_client)
         try:
-            import anthropic
-            self.client = anthropic.Anthropic(api_key=api_key)
+            anthropic = _get_anthropic()
+            self.client = anthropic.AsyncAnthropic(
+                api_key=api_key,
+                http_client=http_client
+            )
         except ImportError:
             raise ImportError("anthropic package is required for Anthropic provider")
     
@@ -97,46 +228,74 @@ class AnthropicProvider(AIProvider):
             max_tokens = kwargs.get('max_tokens', 1000)
             temperature = kwargs.get('temperature', 0.7)
             
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=max_tokens,
-                temperature=temperature,
-                messages=[{"role": "user", "content": prompt}]
-            )
+            request = {
+                "model": self.model,
+                "max_tokens": max_tokens,
+                "temperature": temperature,
+                "messages": [{"role": "user", "content": prompt}]
+            }
+            system = kwargs.get('system')
+            if system:
+                request["system"] = system
+            tools = kwargs.get('tools')
+            if tools:
+                request["tools"] = [
+                    {
+                        "name": tool["name"],
+                        "description": tool["description"],
+                        "input_schema": tool["parameters"]
+                    }
+                    for tool in tools
+                ]
+
+            response = await self.client.messages.create(**request)
+
+            # 发起工具调用时响应中可能只有 tool_use 块，文本需单独收集
+            text_parts = []
+            tool_calls = []
+            for block in response.content:
+                if block.type == "text":
+                    text_parts.append(block.text)
+                elif block.type == "tool_use":
+                    tool_calls.append({"name": block.name, "arguments": block.input})
             
-            return {
+            result = {
                 "success": True,
-                "response": response.content[0].text,
+                "response": "".join(text_parts),
                 "model": self.model,
                 "usage": {
                     "input_tokens": response.usage.input_tokens,
                     "output_tokens": response.usage.output_tokens
                 }
             }
+            if tools:
+                result["tool_calls"] = tool_calls
+            return result
         except Exception as e:
-            logger.error(f"Anthropic API error: {e}")
+            logger.error("Anthropic API error: %s", e)
             return {
                 "success": False,
                 "error": str(e),
                 "model": self.model
             }
-    
-    def get_available_models(self) -> List[str]:
-        """获取Anthropic可用的模型列表。"""
-        return [
-            "claude-3-opus-20240229",
-            "claude-3-sonnet-20240229",
-            "claude-3-haiku-20240307"
-        ]
 
 
 class GoogleProvider(AIProvider):
     """Google Gemini API提供商。"""
 
-    def __init__(self, api_key: str, model: str = "gemini-pro"):
-        super().__init__(api_key, model)
+    __slots__ = ("client",)
+
+    AVAILABLE_MODELS = (
+        "gemini-pro",
+        "gemini-pro-vision",
+    )
+
+    def __init__(self, api_key: str, model: str = "gemini-pro",
+                 http_client: Optional["httpx.AsyncClient"] = None):
+        # SDK 通过 gRPC 访问API，不使用HTTP客户端
+        super().__init__(api_key, model, http_client)
         try:
-            import google.generativeai as genai
+            genai = _get_genai()
             genai.configure(api_key=api_key)
             self.client = genai.GenerativeModel(model)
         except ImportError:
@@ -145,7 +304,9 @@ class GoogleProvider(AIProvider):
     async def generate_response(self, prompt: str, **kwargs) -> Dict[str, Any]:
         """使用Google Gemini API生成响应。"""
         try:
-            response = self.client.generate_content(prompt)
+            # SDK 仅提供同步接口，放到线程池执行，避免阻塞事件循环
+            loop = asyncio.get_running_loop()
+            response = await loop.run_in_executor(None, self.client.generate_content, prompt)
 
             return {
                 "success": True,
@@ -153,32 +314,36 @@ class GoogleProvider(AIProvider):
                 "model": self.model
             }
         except Exception as e:
-            logger.error(f"Google API error: {e}")
+            logger.error("Google API error: %s", e)
             return {
                 "success": False,
                 "error": str(e),
                 "model": self.model
             }
 
-    def get_available_models(self) -> List[str]:
-        """获取Google可用的模型列表。"""
-        return [
-            "gemini-pro",
-            "gemini-pro-vision"
-        ]
-
 
 class DeepSeekProvider(AIProvider):
     """DeepSeek API提供商。"""
 
-    def __init__(self, api_key: str, model: str = "deepseek-chat"):
-        super().__init__(api_key, model)
+    __slots__ = ("client",)
+
+    supports_system_prompt = True
+    supports_tools = True
+    AVAILABLE_MODELS = (
+        "deepseek-chat",
+        "deepseek-coder",
+    )
+
+    def __init__(self, api_key: str, model: str = "deepseek-chat",
+                 http_client: Optional["httpx.AsyncClient"] = None):
+        super().__init__(api_key, model, http_client)
         try:
-            import openai
+            openai = _get_openai()
             # DeepSeek使用OpenAI兼容的API
-            self.client = openai.OpenAI(
+            self.client = openai.AsyncOpenAI(
                 api_key=api_key,
-                base_url="https://api.deepseek.com"
+                base_url="https://api.deepseek.com",
+                http_client=http_client
             )
         except ImportError:
             raise ImportError("openai package is required for DeepSeek provider")
@@ -189,16 +354,27 @@ class DeepSeekProvider(AIProvider):
             max_tokens = kwargs.get('max_tokens', 1000)
             temperature = kwargs.get('temperature', 0.7)
 
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=max_tokens,
-                temperature=temperature
-            )
+            messages = [{"role": "user", "content": prompt}]
+            system = kwargs.get('system')
+            if system:
+                messages.insert(0, {"role": "system", "content": system})
 
-            return {
+            request = {
+                "model": self.model,
+                "messages": messages,
+                "max_tokens": max_tokens,
+                "temperature": temperature
+            }
+            tools = kwargs.get('tools')
+            if tools:
+                request["tools"] = _openai_tools(tools)
+
+            response = await self.client.chat.completions.create(**request)
+            message = response.choices[0].message
+
+            result = {
                 "success": True,
-                "response": response.choices[0].message.content,
+                "response": message.content,
                 "model": self.model,
                 "usage": {
                     "prompt_tokens": response.usage.prompt_tokens,
@@ -206,27 +382,41 @@ class DeepSeekProvider(AIProvider):
                     "total_tokens": response.usage.total_tokens
                 }
             }
+            if tools:
+                result["tool_calls"] = _openai_tool_calls(message)
+            return result
         except Exception as e:
-            logger.error(f"DeepSeek API error: {e}")
+            logger.error("DeepSeek API error: %s", e)
             return {
                 "success": False,
                 "error": str(e),
                 "model": self.model
             }
 
-    def get_available_models(self) -> List[str]:
-        """获取DeepSeek可用的模型列表。"""
-        return [
-            "deepseek-chat",
-            "deepseek-coder"
-        ]
+
+# 提供商名称到实现类的映射
+_PROVIDER_CLASSES: Dict[str, Type[AIProvider]] = {
+    "openai": OpenAIProvider,
+    "anthropic": AnthropicProvider,
+    "google": GoogleProvider,
+    "deepseek": DeepSeekProvider,
+}
+
+# 各提供商的默认模型，未指定模型或模型不适用于提供商时使用
+PROVIDER_DEFAULTS: Dict[str, str] = {
+    "openai": "gpt-3.5-turbo",
+    "anthropic": "claude-3-sonnet-20240229",
+    "google": "gemini-pro",
+    "deepseek": "deepseek-chat",
+}
 
 
 class AIProviderFactory:
     """AI提供商工厂类。"""
     
     @staticmethod
-    def create_provider(provider_name: str, api_key: str, model: Optional[str] = None) -> AIProvider:
+    def create_provider(provider_name: str, api_key: str, model: Optional[str] = None,
+                        http_client: Optional["httpx.AsyncClient"] = None) -> AIProvider:
         """
         创建AI提供商实例。
 
@@ -234,28 +424,52 @@ class AIProviderFactory:
             provider_name: 提供商名称 (openai, anthropic, google, deepseek)
             api_key: API密钥
             model: 模型名称（可选）
+            http_client: 共享的异步HTTP客户端（可选），由调用方负责关闭
 
         Returns:
             AI提供商实例
         """
-        provider_name = provider_name.lower()
-
-        if provider_name == "openai":
-            default_model = "gpt-3.5-turbo"
-            return OpenAIProvider(api_key, model or default_model)
-        elif provider_name == "anthropic":
-            default_model = "claude-3-sonnet-20240229"
-            return AnthropicProvider(api_key, model or default_model)
-        elif provider_name == "google":
-            default_model = "gemini-pro"
-            return GoogleProvider(api_key, model or default_model)
-        elif provider_name == "deepseek":
-            default_model = "deepseek-chat"
-            return DeepSeekProvider(api_key, model or default_model)
-        else:
+        name = provider_name.lower()
+        provider_class = _PROVIDER_CLASSES.get(name)
+        if provider_class is None:
+            raise ValueError(f"Unsupported AI provider: {provider_name}")
+
+        return provider_class(api_key, model or PROVIDER_DEFAULTS[name], http_client=http_client)
+
+    @staticmethod
+    def create_http_client() -> Optional["httpx.AsyncClient"]:
+        """
+        创建可在多个提供商之间共享的异步HTTP客户端，复用连接池与TLS会话。
+
+        客户端的连接绑定在首次使用它的事件循环上，调用方应在同一个事件循环中
+        关闭它；未安装 httpx 时返回 None，各提供商退回使用 SDK 自己的连接池。
+        """
+        if httpx is None:
+            return None
+        # 超时与重定向设置与 openai/anthropic SDK 的默认值保持一致
+        return httpx.AsyncClient(
+            timeout=httpx.Timeout(600.0, connect=5.0),
+            limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+            follow_redirects=True
+        )
+
+    @staticmethod
+    def get_provider_class(provider_name: str) -> Type[AIProvider]:
+        """
+        获取AI提供商类，用于在不创建实例的情况下读取类级信息。
+
+        Args:
+            provider_name: 提供商名称 (openai, anthropic, google, deepseek)
+
+        Returns:
+            AI提供商类
+        """
+        provider_class = _PROVIDER_CLASSES.get(provider_name.lower())
+        if provider_class is None:
             raise ValueError(f"Unsupported AI provider: {provider_name}")
+        return provider_class
 
     @staticmethod
     def get_supported_providers() -> List[str]:
         """获取支持的AI提供商列表。"""
-        return ["openai", "anthropic", "google", "deepseek"]
+        return list(_PROVIDER_CLASSES)
@@ -3,24 +3,76 @@ Command line interface for the File Agent.
 """
 
 import asyncio
+import atexit
+import os
+import queue
 import sys
+import threading
+import time
 import logging
+import logging.handlers
 from pathlib import Path
-from typing import Optional
-
-import click
-from colorama import init, Fore, Style
+from typing import Any, Dict, List, Optional
 
 from .agent import FileAgent
 from .config import Config
+from .file_manager import FileManager
+
+# 设置了 NO_COLOR 或标准输出不是终端时不输出颜色，也不导入 colorama
+_USE_COLOR = not os.getenv("NO_COLOR") and sys.stdout is not None and sys.stdout.isatty()
+
+# ANSI 颜色前缀，由 _colorize() 在首次输出前填充；不输出颜色时保持为空串
+_GREEN = _CYAN = _YELLOW = _RED = _MAGENTA = _BLUE = _RESET = ""
+_colorized = False
+
+
+def _colorize() -> None:
+    """首次输出前导入并初始化 colorama，之后调用直接返回。"""
+    global _colorized, _GREEN, _CYAN, _YELLOW, _RED, _MAGENTA, _BLUE, _RESET
+    if _colorized:
+        return
+    _colorized = True
+    if not _USE_COLOR:
+        return
+    from colorama import init, Fore, Style
+    init(autoreset=True)
+    _GREEN, _CYAN, _YELLOW, _RED = Fore.GREEN, Fore.CYAN, Fore.YELLOW, Fore.RED
+    _MAGENTA, _BLUE, _RESET = Fore.MAGENTA, Fore.BLUE, Style.RESET_ALL
+
+
+# 交互模式的输入历史文件及保留条数
+_HISTORY_FILE = os.path.join(os.path.expanduser("~"), ".file_agent_history")
+_HISTORY_LENGTH = 1000
+
+# 日志文件缓冲：累计条数达到上限、出现 ERROR 及以上记录或定时器到期时写盘
+_LOG_BUFFER_CAPACITY = 1024
+_LOG_FLUSH_INTERVAL = 5.0
+
+
+def _flush_periodically(handler: logging.Handler, interval: float) -> None:
+    """启动守护线程，每隔 interval 秒刷新一次缓冲的日志。"""
+    def flush_loop():
+        while True:
+            time.sleep(interval)
+            handler.flush()
+
+    threading.Thread(target=flush_loop, name="log-flush", daemon=True).start()
 
-# 初始化colorama
-init(autoreset=True)
 
 # 设置日志
 def setup_logging(level: str = "INFO", log_file: Optional[str] = None):
-    """设置日志配置。"""
+    """设置日志配置，重复调用时不会重复添加处理器。"""
     log_level = getattr(logging, level.upper(), logging.INFO)
+    root = logging.getLogger()
+
+    # 已配置过时只调整日志级别，避免重复添加处理器、重复打开日志文件
+    configured = getattr(root, "_file_agent_handlers", None)
+    if configured is not None:
+        if root.level != log_level:
+            root.setLevel(log_level)
+            for handler in configured:
+                handler.setLevel(log_level)
+        return
     
     # 创建日志目录
     if log_file:
@@ -37,171 +89,262 @@ def setup_logging(level: str = "INFO", log_file: Optional[str] = None):
     console_handler.setLevel(log_level)
     console_handler.setFormatter(formatter)
     
-    # 文件处理器
+    # 文件处理器：由后台监听线程写盘，日志调用只把记录放入内存队列，不阻塞事件循环；
+    # 监听线程再把记录攒批写入文件，减少 write 系统调用
     handlers = [console_handler]
     if log_file:
         file_handler = logging.FileHandler(log_file, encoding='utf-8')
-        file_handler.setLevel(log_level)
         file_handler.setFormatter(formatter)
-        handlers.append(file_handler)
+        buffered_handler = logging.handlers.MemoryHandler(
+            _LOG_BUFFER_CAPACITY, flushLevel=logging.ERROR, target=file_handler
+        )
+        _flush_periodically(buffered_handler, _LOG_FLUSH_INTERVAL)
+        # atexit 按注册的逆序执行：先停止监听线程处理完队列，再把缓冲写盘
+        atexit.register(buffered_handler.flush)
+
+        log_queue = queue.SimpleQueue()
+        listener = logging.handlers.QueueListener(log_queue, buffered_handler, respect_handler_level=True)
+        listener.start()
+        atexit.register(listener.stop)
+        # 入队时只合并消息文本，完整格式由 file_handler 在监听线程中处理
+        queue_handler = logging.handlers.QueueHandler(log_queue)
+        queue_handler.setLevel(log_level)
+        queue_handler.setFormatter(logging.Formatter('%(message)s'))
+        handlers.append(queue_handler)
     
     # 配置根日志器
-    logging.basicConfig(
-        level=log_level,
-        handlers=handlers,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
+    root.setLevel(log_level)
+    for handler in handlers:
+        root.addHandler(handler)
+    root._file_agent_handlers = handlers
+
+
+def _write(text: str) -> None:
+    """一次性写出整段文本并刷新，避免多行输出被拆成多次 write 调用。"""
+    sys.stdout.write(text)
+    sys.stdout.flush()
 
 
 def print_banner():
     """打印欢迎横幅。"""
+    _colorize()
     banner = f"""
-{Fore.CYAN}╔══════════════════════════════════════════════════════════════╗
+{_CYAN}╔══════════════════════════════════════════════════════════════╗
 ║                        File Agent v0.1.0                    ║
 ║                   智能文件管理代理                           ║
 ║                                                              ║
 ║  支持自然语言文件操作 + AI智能助手                          ║
-╚══════════════════════════════════════════════════════════════╝{Style.RESET_ALL}
+╚══════════════════════════════════════════════════════════════╝{_RESET}
 """
-    print(banner)
+    _write(banner + "\n")
 
 
 def print_help():
     """打印帮助信息。"""
+    _colorize()
     help_text = f"""
-{Fore.YELLOW}可用命令：{Style.RESET_ALL}
-  {Fore.GREEN}文件操作：{Style.RESET_ALL}
+{_YELLOW}可用命令：{_RESET}
+  {_GREEN}文件操作：{_RESET}
     • 创建文件 "filename.txt"
     • 读取文件 "filename.txt"
     • 删除文件 "filename.txt"
     • 列出文件
     • 创建目录 "dirname"
   
-  {Fore.GREEN}系统命令：{Style.RESET_ALL}
+  {_GREEN}系统命令：{_RESET}
     • help, h - 显示帮助
     • status - 显示系统状态
     • config - 显示配置信息
     • exit, quit, q - 退出程序
   
-  {Fore.GREEN}AI助手：{Style.RESET_ALL}
+  {_GREEN}AI助手：{_RESET}
     • 任何其他输入都会发送给AI助手处理
     
-{Fore.YELLOW}示例：{Style.RESET_ALL}
+{_YELLOW}示例：{_RESET}
   创建一个包含当前时间的日志文件
   读取 "config.yaml" 文件
   列出所有 .py 文件
   帮我分析这个项目的结构
 """
-    print(help_text)
+    _write(help_text + "\n")
 
 
 def format_result(result: dict) -> str:
     """格式化执行结果。"""
-    if result["success"]:
-        message = f"{Fore.GREEN}✓ {result['message']}{Style.RESET_ALL}"
-        
-        # 添加额外信息
-        if "content" in result:
-            content = result["content"]
-            if len(content) > 200:
-                content = content[:200] + "..."
-            message += f"\n{Fore.CYAN}内容预览：{Style.RESET_ALL}\n{content}"
-        
-        if "files" in result:
-            files = result["files"][:10]  # 只显示前10个文件
-            if files:
-                message += f"\n{Fore.CYAN}文件列表：{Style.RESET_ALL}"
-                for file_info in files:
-                    size = f" ({file_info['size']} bytes)" if file_info['size'] else ""
-                    message += f"\n  📄 {file_info['name']}{size}"
-                
-                if len(result["files"]) > 10:
-                    message += f"\n  ... 还有 {len(result['files']) - 10} 个文件"
-        
-        if "directories" in result:
-            dirs = result["directories"][:5]  # 只显示前5个目录
-            if dirs:
-                message += f"\n{Fore.CYAN}目录列表：{Style.RESET_ALL}"
-                for dir_info in dirs:
-                    message += f"\n  📁 {dir_info['name']}"
-                
-                if len(result["directories"]) > 5:
-                    message += f"\n  ... 还有 {len(result['directories']) - 5} 个目录"
-        
-        if "ai_message" in result:
-            message += f"\n{Fore.MAGENTA}AI助手：{Style.RESET_ALL} {result['ai_message']}"
-        
-        if "usage" in result and result["usage"]:
-            usage = result["usage"]
-            if "total_tokens" in usage:
-                message += f"\n{Fore.YELLOW}Token使用：{Style.RESET_ALL} {usage['total_tokens']}"
-    else:
-        message = f"{Fore.RED}✗ {result['message']}{Style.RESET_ALL}"
+    _colorize()
+    if not result["success"]:
+        return f"{_RED}✗ {result['message']}{_RESET}"
+
+    # 各片段先收集到列表中，最后一次性拼接
+    parts = [f"{_GREEN}✓ {result['message']}{_RESET}"]
+    
+    # 添加额外信息
+    if "content" in result:
+        content = result["content"]
+        if len(content) > 200:
+            content = content[:200] + "..."
+        parts.append(f"\n{_CYAN}内容预览：{_RESET}\n{content}")
+    
+    if "files" in result:
+        files = result["files"][:10]  # 只显示前10个文件
+        if files:
+            parts.append(f"\n{_CYAN}文件列表：{_RESET}")
+            for file_info in files:
+                size = f" ({file_info['size']} bytes)" if file_info['size'] else ""
+                parts.append(f"\n  📄 {file_info['name']}{size}")
+            
+            if len(result["files"]) > 10:
+                parts.append(f"\n  ... 还有 {len(result['files']) - 10} 个文件")
+    
+    if "directories" in result:
+        dirs = result["directories"][:5]  # 只显示前5个目录
+        if dirs:
+            parts.append(f"\n{_CYAN}目录列表：{_RESET}")
+            for dir_info in dirs:
+                parts.append(f"\n  📁 {dir_info['name']}")
+            
+            if len(result["directories"]) > 5:
+                parts.append(f"\n  ... 还有 {len(result['directories']) - 5} 个目录")
     
-    return message
+    if "ai_message" in result:
+        parts.append(f"\n{_MAGENTA}AI助手：{_RESET} {result['ai_message']}")
+    
+    if "usage" in result and result["usage"]:
+        usage = result["usage"]
+        if "total_tokens" in usage:
+            parts.append(f"\n{_YELLOW}Token使用：{_RESET} {usage['total_tokens']}")
+    
+    return "".join(parts)
+
+
+# 交互模式的系统命令：输入（小写）-> 动作
+_BUILTINS = {
+    'exit': 'quit', 'quit': 'quit', 'q': 'quit',
+    'help': 'help', 'h': 'help',
+    'status': 'status',
+    'config': 'config',
+}
+
+
+def _show_status(agent: FileAgent) -> None:
+    """打印系统状态。"""
+    status = agent.get_status()
+    lines = [f"{_CYAN}系统状态：{_RESET}"]
+    lines.extend(f"  {key}: {value}" for key, value in status.items())
+    _write("\n".join(lines) + "\n")
+
+
+def _show_config(agent: FileAgent) -> None:
+    """打印当前配置。"""
+    ai_config = agent.config.get_ai_config()
+    fm_config = agent.config.get_file_manager_config()
+    _write(
+        f"{_CYAN}配置信息：{_RESET}\n"
+        f"  AI提供商: {ai_config['provider']}\n"
+        f"  AI模型: {ai_config['model']}\n"
+        f"  工作目录: {fm_config['workspace']}\n"
+        f"  备份启用: {fm_config['backup_enabled']}\n"
+    )
+
+
+def _enable_line_editing() -> bool:
+    """
+    启用 readline 行编辑并加载历史记录，退出时保存历史。
+
+    Windows 上安装 pyreadline3 后同样以 readline 模块提供；都不可用时返回 False，
+    input() 退化为无行编辑的普通输入。
+    """
+    try:
+        import readline
+    except ImportError:
+        return False
+
+    readline.set_history_length(_HISTORY_LENGTH)
+    try:
+        readline.read_history_file(_HISTORY_FILE)
+    except OSError:
+        # 首次运行时历史文件尚不存在
+        pass
+
+    def save_history():
+        try:
+            readline.write_history_file(_HISTORY_FILE)
+        except OSError as e:
+            logging.getLogger(__name__).debug("Failed to save history: %s", e)
+
+    atexit.register(save_history)
+    return True
 
 
 async def interactive_mode(agent: FileAgent):
     """交互式模式。"""
     print_banner()
-    print(f"{Fore.YELLOW}输入 'help' 查看帮助，输入 'exit' 退出{Style.RESET_ALL}\n")
+    print(f"{_YELLOW}输入 'help' 查看帮助，输入 'exit' 退出{_RESET}\n")
+
+    prompt = f"{_BLUE}File Agent> {_RESET}"
+    if _enable_line_editing() and _USE_COLOR:
+        # 用 \001/\002 标出不可见的颜色控制符，readline 才能正确计算提示符宽度
+        prompt = f"\001{_BLUE}\002File Agent> \001{_RESET}\002"
     
     while True:
         try:
             # 获取用户输入
-            user_input = input(f"{Fore.BLUE}File Agent> {Style.RESET_ALL}").strip()
+            user_input = input(prompt).strip()
             
             if not user_input:
                 continue
             
             # 处理系统命令
-            if user_input.lower() in ['exit', 'quit', 'q']:
-                print(f"{Fore.YELLOW}再见！{Style.RESET_ALL}")
+            action = _BUILTINS.get(user_input.lower())
+            if action == 'quit':
+                print(f"{_YELLOW}再见！{_RESET}")
                 break
-            elif user_input.lower() in ['help', 'h']:
+            elif action == 'help':
                 print_help()
                 continue
-            elif user_input.lower() == 'status':
-                status = agent.get_status()
-                print(f"{Fore.CYAN}系统状态：{Style.RESET_ALL}")
-                for key, value in status.items():
-                    print(f"  {key}: {value}")
+            elif action == 'status':
+                _show_status(agent)
                 continue
-            elif user_input.lower() == 'config':
-                ai_config = agent.config.get_ai_config()
-                fm_config = agent.config.get_file_manager_config()
-                print(f"{Fore.CYAN}配置信息：{Style.RESET_ALL}")
-                print(f"  AI提供商: {ai_config['provider']}")
-                print(f"  AI模型: {ai_config['model']}")
-                print(f"  工作目录: {fm_config['workspace']}")
-                print(f"  备份启用: {fm_config['backup_enabled']}")
+            elif action == 'config':
+                _show_config(agent)
                 continue
             
             # 执行用户命令
-            print(f"{Fore.YELLOW}正在处理...{Style.RESET_ALL}")
+            print(f"{_YELLOW}正在处理...{_RESET}")
             result = await agent.execute(user_input)
             
-            # 显示结果
-            print(format_result(result))
-            print()  # 空行分隔
+            # 显示结果，空行分隔
+            _write(format_result(result) + "\n\n")
             
         except KeyboardInterrupt:
-            print(f"\n{Fore.YELLOW}程序被中断，再见！{Style.RESET_ALL}")
+            print(f"\n{_YELLOW}程序被中断，再见！{_RESET}")
             break
         except Exception as e:
-            print(f"{Fore.RED}发生错误: {str(e)}{Style.RESET_ALL}")
+            print(f"{_RED}发生错误: {str(e)}{_RESET}")
 
 
-@click.command()
-@click.option('--command', '-c', help='执行单个命令')
-@click.option('--workspace', '-w', help='指定工作目录')
-@click.option('--config', '-f', help='指定配置文件')
-@click.option('--provider', '-p', help='指定AI提供商 (openai, anthropic, google, deepseek)')
-@click.option('--model', '-m', help='指定AI模型')
-@click.option('--verbose', '-v', is_flag=True, help='详细输出')
-def main(command, workspace, config, provider, model, verbose):
-    """File Agent - 智能文件管理代理"""
-    
+async def _run_once(agent: FileAgent, command: str) -> dict:
+    """执行单个命令并返回结果。"""
+    return await agent.execute(command)
+
+
+async def _session(agent: FileAgent, command: Optional[str]) -> None:
+    """在同一个事件循环中执行单个命令或运行交互模式，结束时关闭AI提供商的连接池。"""
+    try:
+        if command:
+            # 单命令模式
+            _write(format_result(await _run_once(agent, command)) + "\n")
+        else:
+            # 交互模式
+            await interactive_mode(agent)
+    finally:
+        await agent.aclose()
+
+
+def run(command, workspace, config, provider, model, verbose):
+    """按命令行参数启动代理：执行单个命令或进入交互模式。"""
+    _colorize()
+
     # 设置日志
     log_level = "DEBUG" if verbose else "INFO"
     setup_logging(log_level, "./logs/agent.log")
@@ -213,6 +356,7 @@ def main(command, workspace, config, provider, model, verbose):
         # 应用命令行参数覆盖配置
         if workspace:
             agent.config.set("file_manager.default_workspace", workspace)
+            agent.invalidate_config_cache()
             # 重新初始化文件管理器
             fm_config = agent.config.get_file_manager_config()
             agent.file_manager = FileManager(
@@ -220,27 +364,92 @@ def main(command, workspace, config, provider, model, verbose):
                 backup_enabled=fm_config["backup_enabled"]
             )
         
-        if provider:
-            agent.config.set("ai.default_provider", provider)
-            agent._setup_ai_provider()
+        if provider or model:
+            agent.switch_model(provider, model)
         
-        if model:
-            agent.config.set("ai.default_model", model)
-            agent._setup_ai_provider()
-        
-        # 执行单个命令或进入交互模式
-        if command:
-            # 单命令模式
-            result = asyncio.run(agent.execute(command))
-            print(format_result(result))
-        else:
-            # 交互模式
-            asyncio.run(interactive_mode(agent))
+        # 执行单个命令或进入交互模式，整个会话只创建一个事件循环
+        asyncio.run(_session(agent, command))
     
     except Exception as e:
-        print(f"{Fore.RED}启动失败: {str(e)}{Style.RESET_ALL}")
+        print(f"{_RED}启动失败: {str(e)}{_RESET}")
         sys.exit(1)
 
 
+# 命令行选项：参数名 -> 对应的 run() 参数
+_OPTIONS = {
+    '-c': 'command', '--command': 'command',
+    '-w': 'workspace', '--workspace': 'workspace',
+    '-f': 'config', '--config': 'config',
+    '-p': 'provider', '--provider': 'provider',
+    '-m': 'model', '--model': 'model',
+}
+# 不带值的开关选项
+_FLAGS = {'-v': 'verbose', '--verbose': 'verbose'}
+
+_USAGE = "Usage: file-agent [OPTIONS]"
+
+_HELP = f"""{_USAGE}
+
+  File Agent - 智能文件管理代理
+
+Options:
+  -c, --command TEXT    执行单个命令
+  -w, --workspace TEXT  指定工作目录
+  -f, --config TEXT     指定配置文件
+  -p, --provider TEXT   指定AI提供商 (openai, anthropic, google, deepseek)
+  -m, --model TEXT      指定AI模型
+  -v, --verbose         详细输出
+  -h, --help            显示帮助并退出
+"""
+
+
+def _usage_error(message: str) -> None:
+    """打印用法错误并以状态码 2 退出。"""
+    print(f"{_USAGE}\nTry 'file-agent --help' for help.\n\nError: {message}", file=sys.stderr)
+    sys.exit(2)
+
+
+def parse_argv(argv: List[str]) -> Dict[str, Any]:
+    """
+    解析命令行参数。
+
+    支持 `-c value`、`--command value` 和 `--command=value` 三种写法，
+    同一选项出现多次时以最后一次为准。
+
+    Args:
+        argv: 命令行参数（不含程序名）
+
+    Returns:
+        run() 的关键字参数字典
+    """
+    options: Dict[str, Any] = dict.fromkeys(('command', 'workspace', 'config', 'provider', 'model'))
+    options['verbose'] = False
+
+    args = iter(argv)
+    for arg in args:
+        if arg in ('-h', '--help'):
+            print(_HELP, end='')
+            sys.exit(0)
+        if arg in _FLAGS:
+            options[_FLAGS[arg]] = True
+            continue
+
+        name, sep, value = arg.partition('=') if arg.startswith('--') else (arg, '', '')
+        if name not in _OPTIONS:
+            _usage_error(f"No such option: {name}" if arg.startswith('-') else f"Got unexpected extra argument ({arg})")
+        if not sep:
+            value = next(args, None)
+            if value is None:
+                _usage_error(f"Option '{name}' requires an argument.")
+        options[_OPTIONS[name]] = value
+
+    return options
+
+
+def main(argv: Optional[List[str]] = None):
+    """File Agent - 智能文件管理代理"""
+    run(**parse_argv(sys.argv[1:] if argv is None else argv))
+
+
 if __name__ == "__main__":
     main()
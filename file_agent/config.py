@@ -2,19 +2,87 @@
 Configuration management module for the File Agent.
 """
 
+import copy
+import functools
 import os
-import yaml
-import json
 from pathlib import Path
-from typing import Dict, Any, Optional
-from dotenv import load_dotenv
+from types import MappingProxyType
+from typing import Dict, Any, Mapping, Optional, Tuple
 import logging
 
+try:
+    # orjson 解析更快，未安装时使用标准库；ai_providers 也使用这里的 _json_loads
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    import json
+    _json_loads = json.loads
+
 logger = logging.getLogger(__name__)
 
+# 缓存中表示“未找到配置项”的标记，区别于值为 None 的配置
+_MISSING = object()
+
+# 支持的AI提供商及其API密钥环境变量名
+_PROVIDERS = ("openai", "anthropic", "google", "deepseek")
+_PROVIDER_ENV = {provider: f"{provider.upper()}_API_KEY" for provider in _PROVIDERS}
+_PROVIDER_KEY_PATHS = {provider: f"api_keys.{provider}" for provider in _PROVIDERS}
+_VALID_PROVIDERS = frozenset(_PROVIDERS)
+
+# 环境变量文件名，在当前目录及其上两级目录中查找，存在时才导入 python-dotenv 加载
+_DOTENV_FILE = ".env"
+_DOTENV_SEARCH_DEPTH = 2
+# 进程内只加载一次 .env
+_dotenv_loaded = False
+
+
+@functools.lru_cache(maxsize=128)
+def _split_key(key: str) -> Tuple[str, ...]:
+    """拆分点分隔的配置键，调用点的键多为字面量，拆分结果可以复用。"""
+    return tuple(key.split('.'))
+
+
+@functools.lru_cache(maxsize=None)
+def _yaml_loader() -> Any:
+    """首次解析 YAML 时才导入 yaml，优先使用 libyaml 的 C 实现（解析速度明显更快）。"""
+    import yaml
+    return getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+def _find_dotenv() -> Optional[Path]:
+    """在当前目录及其上两级目录中查找 .env 文件。"""
+    directory = Path.cwd()
+    for _ in range(_DOTENV_SEARCH_DEPTH + 1):
+        candidate = directory / _DOTENV_FILE
+        if candidate.is_file():
+            return candidate
+        directory = directory.parent
+    return None
+
+
+def _load_dotenv() -> None:
+    """加载 .env 中的环境变量，每个进程只执行一次；文件不存在或未安装 python-dotenv 时跳过。"""
+    global _dotenv_loaded
+    if _dotenv_loaded:
+        return
+    _dotenv_loaded = True
+
+    dotenv_path = _find_dotenv()
+    if dotenv_path is None:
+        return
+    try:
+        from dotenv import load_dotenv
+    except ImportError:
+        logger.debug("python-dotenv not installed, skipping %s", dotenv_path)
+        return
+    load_dotenv(dotenv_path)
+
 
 class Config:
     """配置管理类。"""
+
+    # 已解析的配置文件：绝对路径 -> (st_mtime_ns, 解析结果)，所有实例共享
+    _parse_cache: Dict[str, Tuple[int, Any]] = {}
     
     def __init__(self, config_file: Optional[str] = None):
         """
@@ -24,10 +92,17 @@ class Config:
             config_file: 配置文件路径（可选）
         """
         # 加载环境变量
-        load_dotenv()
+        _load_dotenv()
         
         self.config_file = config_file or "config.yaml"
         self.config_data = {}
+
+        # get() 的解析结果缓存：点分隔键 -> 值或 _MISSING
+        self._cache: Dict[str, Any] = {}
+        # 各分组配置的只读快照，get_*_config() 返回其副本：配置分组名 -> 快照
+        self._sections: Dict[str, Mapping[str, Any]] = {}
+        # 各提供商的API密钥，首次使用时解析；只有修改 api_keys.* 或重新加载配置时失效
+        self._api_keys: Optional[Mapping[str, Optional[str]]] = None
         
         # 默认配置
         self.defaults = {
@@ -35,7 +110,8 @@ class Config:
                 "default_provider": "openai",
                 "default_model": "gpt-3.5-turbo",
                 "max_tokens": 1000,
-                "temperature": 0.7
+                "temperature": 0.7,
+                "friendly_confirmations": False
             },
             "file_manager": {
                 "default_workspace": "./workspace",
@@ -54,14 +130,11 @@ class Config:
     
     def load_config(self) -> None:
         """加载配置文件。"""
+        self._invalidate()
         try:
             config_path = Path(self.config_file)
             if config_path.exists():
-                with open(config_path, 'r', encoding='utf-8') as f:
-                    if config_path.suffix.lower() == '.json':
-                        self.config_data = json.load(f)
-                    else:
-                        self.config_data = yaml.safe_load(f) or {}
+                self.config_data = self._parse_file(config_path)
                 logger.info(f"Loaded configuration from {config_path}")
             else:
                 logger.info("Configuration file not found, using defaults")
@@ -71,8 +144,7 @@ class Config:
             local_config_path = Path("config.local.yaml")
             if local_config_path.exists():
                 try:
-                    with open(local_config_path, 'r', encoding='utf-8') as f:
-                        local_config = yaml.safe_load(f) or {}
+                    local_config = self._parse_file(local_config_path)
 
                     # 合并本地配置，本地配置优先级更高
                     self._merge_config(self.config_data, local_config)
@@ -83,13 +155,42 @@ class Config:
             logger.error(f"Failed to load configuration: {e}")
             self.config_data = {}
 
+    @classmethod
+    def _parse_file(cls, path: Path) -> Any:
+        """
+        解析 YAML/JSON 配置文件。
+
+        解析结果按 (绝对路径, st_mtime_ns) 缓存，文件未修改时重复加载无需再次解析；
+        返回深拷贝，调用方（如 set()）可以自由修改。
+        """
+        cache_key = os.path.abspath(path)
+        mtime = path.stat().st_mtime_ns
+        cached = cls._parse_cache.get(cache_key)
+        if cached is not None and cached[0] == mtime:
+            return copy.deepcopy(cached[1])
+
+        # 一次读入全部字节，由解析器自行解码，省去文本层的缓冲和解码开销
+        raw = path.read_bytes()
+        if path.suffix.lower() == '.json':
+            data = _json_loads(raw)
+        else:
+            import yaml
+            data = yaml.load(raw, Loader=_yaml_loader()) or {}
+        cls._parse_cache[cache_key] = (mtime, data)
+        return copy.deepcopy(data)
+
     def _merge_config(self, base_config: dict, override_config: dict) -> None:
         """合并配置字典，override_config 的值会覆盖 base_config。"""
-        for key, value in override_config.items():
-            if key in base_config and isinstance(base_config[key], dict) and isinstance(value, dict):
-                self._merge_config(base_config[key], value)
-            else:
-                base_config[key] = value
+        # 用显式栈逐层合并嵌套字典，避免深层配置的递归开销
+        stack = [(base_config, override_config)]
+        while stack:
+            base, override = stack.pop()
+            for key, value in override.items():
+                base_value = base.get(key)
+                if isinstance(base_value, dict) and isinstance(value, dict):
+                    stack.append((base_value, value))
+                else:
+                    base[key] = value
     
     def save_config(self) -> None:
         """保存配置到文件。"""
@@ -99,8 +200,10 @@ class Config:
             
             with open(config_path, 'w', encoding='utf-8') as f:
                 if config_path.suffix.lower() == '.json':
+                    import json
                     json.dump(self.config_data, f, indent=2, ensure_ascii=False)
                 else:
+                    import yaml
                     yaml.dump(self.config_data, f, default_flow_style=False, allow_unicode=True)
             
             logger.info(f"Saved configuration to {config_path}")
@@ -110,6 +213,9 @@ class Config:
     def get(self, key: str, default: Any = None) -> Any:
         """
         获取配置值。
+
+        解析结果会被缓存，环境变量在首次读取某个键时确定；
+        通过 set() 修改或重新加载配置后缓存失效。
         
         Args:
             key: 配置键（支持点分隔的嵌套键，如 'ai.default_provider'）
@@ -118,6 +224,14 @@ class Config:
         Returns:
             配置值
         """
+        try:
+            value = self._cache[key]
+        except KeyError:
+            value = self._cache[key] = self._resolve(key)
+        return default if value is _MISSING else value
+
+    def _resolve(self, key: str) -> Any:
+        """按环境变量、配置文件、默认配置的顺序查找配置值，未找到时返回 _MISSING。"""
         # 首先检查环境变量
         env_key = key.upper().replace('.', '_')
         env_value = os.getenv(env_key)
@@ -125,7 +239,7 @@ class Config:
             return env_value
         
         # 然后检查配置文件
-        keys = key.split('.')
+        keys = _split_key(key)
         value = self.config_data
         
         for k in keys:
@@ -144,7 +258,7 @@ class Config:
             if isinstance(value, dict) and k in value:
                 value = value[k]
             else:
-                return default
+                return _MISSING
         
         return value
     
@@ -156,7 +270,7 @@ class Config:
             key: 配置键（支持点分隔的嵌套键）
             value: 配置值
         """
-        keys = key.split('.')
+        keys = _split_key(key)
         config = self.config_data
         
         # 创建嵌套字典结构
@@ -166,48 +280,88 @@ class Config:
             config = config[k]
         
         config[keys[-1]] = value
-    
-    def get_ai_config(self) -> Dict[str, Any]:
-        """获取AI相关配置。"""
+        # 嵌套键之间相互影响，整体清空缓存；API密钥只在修改 api_keys 分组时重新解析
+        self._invalidate(api_keys=keys[0] == "api_keys")
+
+    def _invalidate(self, api_keys: bool = True) -> None:
+        """清空配置值缓存和各分组的配置快照，api_keys 为 True 时同时丢弃已解析的API密钥。"""
+        self._cache.clear()
+        self._sections.clear()
+        if api_keys:
+            self._api_keys = None
+
+    def _resolve_api_keys(self) -> Mapping[str, Optional[str]]:
+        """解析各提供商的API密钥，结果缓存到下一次失效。"""
+        if self._api_keys is not None:
+            return self._api_keys
+
         # 获取API密钥，优先级：环境变量 > 本地配置文件 > 配置文件
         api_keys = {}
-        providers = ["openai", "anthropic", "google", "deepseek"]
 
-        for provider in providers:
+        for provider in _PROVIDERS:
             # 1. 首先检查环境变量
-            env_key = f"{provider.upper()}_API_KEY"
-            api_key = os.getenv(env_key)
+            api_key = os.getenv(_PROVIDER_ENV[provider])
 
             # 2. 如果环境变量没有或是示例值，检查本地配置文件
             if not api_key or api_key.startswith("your_"):
-                api_key = self.get(f"api_keys.{provider}")
+                api_key = self.get(_PROVIDER_KEY_PATHS[provider])
 
             api_keys[provider] = api_key
 
-        return {
+        self._api_keys = MappingProxyType(api_keys)
+        return self._api_keys
+    
+    def get_ai_config(self) -> Dict[str, Any]:
+        """获取AI相关配置，返回的字典（包括其中的 api_keys）可以自由修改。"""
+        ai_config = dict(self._ai_section())
+        ai_config["api_keys"] = dict(ai_config["api_keys"])
+        return ai_config
+
+    def get_file_manager_config(self) -> Dict[str, Any]:
+        """获取文件管理器相关配置。"""
+        return dict(self._file_manager_section())
+
+    def get_logging_config(self) -> Dict[str, Any]:
+        """获取日志相关配置。"""
+        return dict(self._logging_section())
+
+    def _ai_section(self) -> Mapping[str, Any]:
+        """AI相关配置的只读快照，配置修改前重复调用返回同一对象。"""
+        snapshot = self._sections.get("ai")
+        if snapshot is not None:
+            return snapshot
+
+        snapshot = self._sections["ai"] = MappingProxyType({
             "provider": self.get("ai.default_provider", "openai"),
             "model": self.get("ai.default_model", "gpt-3.5-turbo"),
             "max_tokens": self.get("ai.max_tokens", 1000),
             "temperature": self.get("ai.temperature", 0.7),
-            "api_keys": api_keys
-        }
+            "api_keys": self._resolve_api_keys()
+        })
+        return snapshot
     
-    def get_file_manager_config(self) -> Dict[str, Any]:
-        """获取文件管理器相关配置。"""
-        return {
-            "workspace": self.get("file_manager.default_workspace", "./workspace"),
-            "max_file_size_mb": self.get("file_manager.max_file_size_mb", 10),
-            "backup_enabled": self.get("file_manager.backup_enabled", True),
-            "backup_dir": self.get("file_manager.backup_dir", "./backups")
-        }
+    def _file_manager_section(self) -> Mapping[str, Any]:
+        """文件管理器相关配置的只读快照。"""
+        snapshot = self._sections.get("file_manager")
+        if snapshot is None:
+            snapshot = self._sections["file_manager"] = MappingProxyType({
+                "workspace": self.get("file_manager.default_workspace", "./workspace"),
+                "max_file_size_mb": self.get("file_manager.max_file_size_mb", 10),
+                "backup_enabled": self.get("file_manager.backup_enabled", True),
+                "backup_dir": self.get("file_manager.backup_dir", "./backups")
+            })
+        return snapshot
     
-    def get_logging_config(self) -> Dict[str, Any]:
-        """获取日志相关配置。"""
-        return {
-            "level": self.get("logging.level", "INFO"),
-            "file": self.get("logging.file", "./logs/agent.log"),
-            "format": self.get("logging.format", "%(asctime)s - %(name)s - %(levelname)s - %(message)s")
-        }
+    def _logging_section(self) -> Mapping[str, Any]:
+        """日志相关配置的只读快照。"""
+        snapshot = self._sections.get("logging")
+        if snapshot is None:
+            snapshot = self._sections["logging"] = MappingProxyType({
+                "level": self.get("logging.level", "INFO"),
+                "file": self.get("logging.file", "./logs/agent.log"),
+                "format": self.get("logging.format", "%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+            })
+        return snapshot
     
     def validate_config(self) -> Dict[str, Any]:
         """
@@ -219,24 +373,26 @@ class Config:
         issues = []
         
         # 检查AI配置
-        ai_config = self.get_ai_config()
+        ai_config = self._ai_section()
         provider = ai_config["provider"]
         
-        if provider not in ["openai", "anthropic", "google", "deepseek"]:
+        if provider not in _VALID_PROVIDERS:
             issues.append(f"Invalid AI provider: {provider}")
         
         api_key = ai_config["api_keys"].get(provider)
-        if not api_key or api_key.startswith("your_") or api_key == "your_api_key_here":
+        if not api_key or api_key.startswith("your_"):
             issues.append(f"Missing API key for provider: {provider}")
         
         # 检查文件管理器配置
-        fm_config = self.get_file_manager_config()
+        fm_config = self._file_manager_section()
         workspace = Path(fm_config["workspace"])
         
-        try:
-            workspace.mkdir(parents=True, exist_ok=True)
-        except Exception as e:
-            issues.append(f"Cannot create workspace directory: {e}")
+        # 目录已存在（最常见的情况）时无需再走 mkdir
+        if not workspace.is_dir():
+            try:
+                workspace.mkdir(parents=True, exist_ok=True)
+            except Exception as e:
+                issues.append(f"Cannot create workspace directory: {e}")
         
         return {
             "valid": len(issues) == 0,
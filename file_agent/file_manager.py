@@ -2,20 +2,307 @@
 File management module for the File Agent.
 """
 
+import asyncio
+import errno
+import fnmatch
+import functools
+import mmap
 import os
+import re
 import shutil
-import json
-import yaml
+import stat
+import sys
+import threading
+import time
 from pathlib import Path
-from typing import List, Dict, Any, Optional, Union
+from typing import Callable, List, Dict, Any, Optional, Tuple, Union
+from collections import OrderedDict
 from datetime import datetime
 import logging
 
+try:
+    import fcntl
+except ImportError:
+    # Windows 没有 fcntl，备份不使用 reflink
+    fcntl = None
+
 logger = logging.getLogger(__name__)
 
+# Linux 的 FICLONE ioctl：在 Btrfs/XFS 等文件系统上创建写时复制的 reflink
+_FICLONE = 0x40049409
+
+# list_files 缓存的最大条目数
+_LIST_CACHE_SIZE = 128
+
+# 写文件的缓冲区大小；显式指定还能省去 open 时探测终端和块大小的 isatty/fstat 调用
+_WRITE_BUFFER_SIZE = 1 << 20
+
+
+# 单次 copy_file_range/sendfile 调用复制的最大字节数
+_COPY_CHUNK_SIZE = 1 << 30
+# 用户态复制的缓冲区大小
+_COPY_BUFFER_SIZE = 1 << 20
+
+# 超过该大小的文件映射到内存后直接解码，省去读入缓冲区的一次复制
+_MMAP_THRESHOLD = 1 << 20
+
+# 超过该大小的文件用 O_DIRECT 读取，绕过页缓存；不支持的平台上为 0
+_O_DIRECT = getattr(os, "O_DIRECT", 0)
+_DIRECT_IO_THRESHOLD = 4 << 20
+# O_DIRECT 每次读取的字节数，需是逻辑块大小的整数倍
+_DIRECT_IO_CHUNK = 1 << 20
+
+
+def _copy_fd(src_fd: int, dst_fd: int) -> None:
+    """
+    从 src_fd 的当前位置复制到末尾，写入 dst_fd。
+
+    依次尝试 copy_file_range（Linux 4.5+）和 sendfile，在内核中完成复制；
+    都不支持时退回用户态读写。每种方式都从文件当前位置继续，中途切换也不会重复复制。
+    """
+    copy_file_range = getattr(os, "copy_file_range", None)
+    if copy_file_range is not None:
+        try:
+            while copy_file_range(src_fd, dst_fd, _COPY_CHUNK_SIZE):
+                pass
+            return
+        except OSError:
+            # 跨文件系统（旧内核）、文件系统不支持等
+            pass
+
+    sendfile = getattr(os, "sendfile", None)
+    if sendfile is not None and sys.platform.startswith("linux"):
+        try:
+            while sendfile(dst_fd, src_fd, None, _COPY_CHUNK_SIZE):
+                pass
+            return
+        except OSError:
+            pass
+
+    while True:
+        chunk = os.read(src_fd, _COPY_BUFFER_SIZE)
+        if not chunk:
+            return
+        view = memoryview(chunk)
+        while view:
+            view = view[os.write(dst_fd, view):]
+
+
+def _reflink(src: str, dst: str) -> bool:
+    """
+    尝试以 reflink 方式把文件内容复制到新文件 dst，文件系统不支持时返回 False 并清理目标文件。
+
+    dst 以 O_EXCL 创建，已存在时抛出 FileExistsError，不会截断已有的文件。
+    """
+    if fcntl is None or not sys.platform.startswith("linux"):
+        return False
+    src_fd = os.open(src, os.O_RDONLY)
+    try:
+        dst_fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+        try:
+            fcntl.ioctl(dst_fd, _FICLONE, src_fd)
+        except OSError:
+            os.close(dst_fd)
+            os.unlink(dst)
+            return False
+        os.close(dst_fd)
+    finally:
+        os.close(src_fd)
+    shutil.copystat(src, dst)
+    return True
+
+
+def _copy2(src: str, dst: str, src_stat: os.stat_result, exclusive: bool = False) -> None:
+    """
+    与 shutil.copy2 等价的复制（内容加元数据），普通文件的内容在内核中复制。
+
+    目标是目录时复制到该目录下；源文件不是普通文件时直接交给 shutil.copy2 处理。
+    exclusive 为 True 时只创建新文件，目标已存在则抛出 FileExistsError。
+    """
+    if exclusive:
+        if os.path.lexists(dst):
+            raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), dst)
+    elif os.path.isdir(dst):
+        dst = os.path.join(dst, os.path.basename(src))
+    if not stat.S_ISREG(src_stat.st_mode):
+        shutil.copy2(src, dst)
+        return
+
+    if not exclusive:
+        try:
+            dst_stat = os.stat(dst)
+        except OSError:
+            pass
+        else:
+            if (dst_stat.st_dev, dst_stat.st_ino) == (src_stat.st_dev, src_stat.st_ino):
+                raise shutil.SameFileError(f"{src!r} and {dst!r} are the same file")
+
+    src_fd = os.open(src, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    try:
+        mode = os.O_EXCL if exclusive else os.O_TRUNC
+        dst_fd = os.open(dst, os.O_WRONLY | os.O_CREAT | mode | getattr(os, "O_BINARY", 0), 0o666)
+        try:
+            _copy_fd(src_fd, dst_fd)
+        finally:
+            os.close(dst_fd)
+    finally:
+        os.close(src_fd)
+    shutil.copystat(src, dst)
+
+
+@functools.lru_cache(maxsize=64)
+def _compile_glob(pattern: str) -> Optional[Callable[[str], Any]]:
+    """把通配符模式编译成匹配函数（区分大小写，同 fnmatchcase）；"*" 匹配一切，返回 None。"""
+    if pattern == "*":
+        return None
+    return re.compile(fnmatch.translate(pattern)).match
+
+
+def _translate_newlines(content: str) -> str:
+    """按文本模式的规则把 \\r\\n 和 \\r 统一转换为 \\n。"""
+    if "\r" in content:
+        content = content.replace("\r\n", "\n").replace("\r", "\n")
+    return content
+
+
+def _read_direct(file_path: str, size: int, encoding: str) -> Optional[Tuple[str, os.stat_result]]:
+    """
+    用 O_DIRECT 读取整个文本文件，数据由内核直接写入页对齐的匿名映射。
+
+    文件系统不支持 O_DIRECT（如 tmpfs）、读取未对齐或文件在读取期间变长时返回 None，
+    由调用方退回普通读取。
+    """
+    try:
+        fd = os.open(file_path, os.O_RDONLY | _O_DIRECT)
+    except OSError as e:
+        if e.errno == errno.EINVAL:
+            return None
+        raise
+    try:
+        st = os.fstat(fd)
+        # 多留一个块，读满缓冲区说明文件已经变长
+        capacity = (max(size, st.st_size) // _DIRECT_IO_CHUNK + 2) * _DIRECT_IO_CHUNK
+        with mmap.mmap(-1, capacity) as buf:
+            with memoryview(buf) as view:
+                total = 0
+                try:
+                    while total < capacity:
+                        n = os.readv(fd, [view[total:total + _DIRECT_IO_CHUNK]])
+                        if not n:
+                            break
+                        total += n
+                except OSError as e:
+                    if e.errno == errno.EINVAL:
+                        return None
+                    raise
+                if total == capacity:
+                    return None
+                content = str(view[:total], encoding)
+    finally:
+        os.close(fd)
+    return _translate_newlines(content), st
+
+
+def _read_mapped(file_path: str, encoding: str) -> Optional[Tuple[str, os.stat_result]]:
+    """
+    把整个文件映射到内存后直接解码。
+
+    文件在 stat 之后被清空或不支持映射（如部分特殊文件）时返回 None，由调用方退回普通读取。
+    """
+    fd = os.open(file_path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    try:
+        st = os.fstat(fd)
+        try:
+            mm = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            return None
+    finally:
+        os.close(fd)
+    with mm:
+        content = str(mm, encoding)
+    return _translate_newlines(content), st
+
+
+def _tmp_path(file_path: str) -> str:
+    """目标文件旁的临时文件路径，按进程和线程区分，rename 到目标时不跨文件系统。"""
+    return f"{file_path}.tmp.{os.getpid()}.{threading.get_ident()}"
+
+
+@functools.lru_cache(maxsize=1)
+def _backup_timestamp(second: int) -> str:
+    """把秒级时间戳格式化为备份文件名使用的 YYYYmmdd_HHMMSS，同一秒内复用结果。"""
+    tm = time.localtime(second)
+    return (f"{tm.tm_year:04d}{tm.tm_mon:02d}{tm.tm_mday:02d}_"
+            f"{tm.tm_hour:02d}{tm.tm_min:02d}{tm.tm_sec:02d}")
+
+
+def _copy_listing(result: Dict[str, Any]) -> Dict[str, Any]:
+    """复制列表结果，连同其中的条目列表和条目字典，调用方修改返回值不会影响缓存。"""
+    copied = dict(result)
+    for key in ("files", "directories"):
+        copied[key] = [dict(item) for item in result[key]]
+    return copied
+
+
+def _stat_memoize(method: Callable[..., Dict[str, Any]]) -> Callable[..., Dict[str, Any]]:
+    """
+    缓存非递归目录列表结果，以目录的 st_mtime_ns 作为指纹。
+
+    目录中增删、重命名条目会改变目录 mtime，从而使缓存失效；通过本管理器
+    执行的修改操作会直接清空缓存。外部程序仅修改已有文件内容时目录 mtime
+    不变，列表中的大小和修改时间可能暂时是旧值。
+    """
+    @functools.wraps(method)
+    def wrapper(self: "FileManager", path: str = ".", pattern: str = "*",
+                recursive: bool = False) -> Dict[str, Any]:
+        if recursive:
+            # 子目录的变化不会反映在顶层目录的 mtime 上，递归列表不缓存
+            return method(self, path, pattern, recursive)
+        try:
+            mtime_ns = os.stat(self._get_full_path(path)).st_mtime_ns
+        except OSError:
+            return method(self, path, pattern, recursive)
+
+        key = (str(path), pattern)
+        # 操作可能在多个线程中并发执行，缓存的读改写需要加锁
+        with self._list_lock:
+            cached = self._list_cache.get(key)
+            if cached is not None and cached[0] == mtime_ns:
+                self._list_cache.move_to_end(key)
+            else:
+                cached = None
+        # 缓存的结果不会被原地修改，复制可以在锁外进行
+        if cached is not None:
+            return _copy_listing(cached[1])
+
+        result = method(self, path, pattern, recursive)
+        if result["success"]:
+            with self._list_lock:
+                self._list_cache[key] = (mtime_ns, result)
+                self._list_cache.move_to_end(key)
+                if len(self._list_cache) > _LIST_CACHE_SIZE:
+                    self._list_cache.popitem(last=False)
+            # 返回副本，避免调用方修改结果时污染缓存
+            return _copy_listing(result)
+        return result
+
+    return wrapper
+
 
 class FileManager:
     """文件管理器类，提供文件和目录的基本操作功能。"""
+
+    # 可通过 batch_apply 批量调用的文件操作方法
+    BATCH_OPERATIONS = frozenset({
+        "create_file",
+        "read_file",
+        "write_file",
+        "delete_file",
+        "move_file",
+        "copy_file",
+        "create_directory",
+        "list_files",
+    })
     
     def __init__(self, workspace: str = "./workspace", backup_enabled: bool = True):
         """
@@ -26,41 +313,167 @@ class FileManager:
             backup_enabled: 是否启用备份功能
         """
         self.workspace = Path(workspace).resolve()
+        # 热路径使用字符串路径和 os.path，避免反复构造 Path 对象
+        self._root = str(self.workspace)
         self.backup_enabled = backup_enabled
         self.backup_dir = Path("./backups").resolve()
+        # list_files 结果缓存：(路径, 模式) -> (目录 mtime_ns, 结果)
+        self._list_cache: "OrderedDict[Tuple[str, str], Tuple[int, Dict[str, Any]]]" = OrderedDict()
+        self._list_lock = threading.Lock()
         
         # 确保工作目录和备份目录存在
         self.workspace.mkdir(parents=True, exist_ok=True)
         if self.backup_enabled:
             self.backup_dir.mkdir(parents=True, exist_ok=True)
     
-    def _get_full_path(self, path: Union[str, Path]) -> Path:
-        """获取相对于工作目录的完整路径。"""
-        path = Path(path)
-        if path.is_absolute():
-            return path
-        return self.workspace / path
+    def _invalidate_listing(self) -> None:
+        """清空 list_files 缓存；与缓存的读写共用同一把锁。"""
+        with self._list_lock:
+            self._list_cache.clear()
+
+    def _get_full_path(self, path: Union[str, Path]) -> str:
+        """获取相对于工作目录的完整路径（已规范化的字符串）。"""
+        path = os.fspath(path)
+        if os.path.isabs(path):
+            return os.path.normpath(path)
+        return os.path.normpath(os.path.join(self._root, path))
+
+    def _relative_to_workspace(self, full_path: str) -> str:
+        """返回相对于工作目录的路径，不在工作目录内时抛出 ValueError。"""
+        if full_path == self._root:
+            return "."
+        prefix = self._root if self._root.endswith(os.sep) else self._root + os.sep
+        if not full_path.startswith(prefix):
+            raise ValueError(f"{full_path!r} is not in the subpath of {self._root!r}")
+        return full_path[len(prefix):]
+
+    @staticmethod
+    def _ensure_parent(file_path: str) -> None:
+        """确保文件的父目录存在。"""
+        parent = os.path.dirname(file_path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
     
-    def _create_backup(self, file_path: Path) -> Optional[Path]:
-        """为文件创建备份。"""
-        if not self.backup_enabled or not file_path.exists():
-            return None
+    def _create_backup(self, file_path: str, link_ok: bool = False) -> Optional[str]:
+        """
+        为文件创建备份。
 
-        # 确保备份目录存在
-        self.backup_dir.mkdir(parents=True, exist_ok=True)
+        依次尝试硬链接（link_ok 为 True 时）、reflink 和完整复制。硬链接与原文件
+        共享数据，只有在原文件随后会被删除或通过 rename 整体替换（而不是原地修改）
+        时才能使用；删除或替换失败时调用方应通过 _discard_linked_backup 丢弃该备份。
+        备份文件总是新建的，同名备份已存在时换用带序号的文件名，不会打开已有的备份。
+
+        Args:
+            file_path: 要备份的文件
+            link_ok: 调用方随后会删除或通过 rename 替换该路径，允许用硬链接作为备份
+        """
+        if not self.backup_enabled:
+            return None
+        try:
+            file_stat = os.lstat(file_path)
+            # 符号链接备份的是其指向的文件内容，硬链接会指向仍在使用的目标文件，不能使用
+            if stat.S_ISLNK(file_stat.st_mode):
+                link_ok = False
+                file_stat = os.stat(file_path)
+        except OSError:
+            return None
 
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_name = f"{file_path.name}.{timestamp}.bak"
-        backup_path = self.backup_dir / backup_name
+        backup_dir = os.fspath(self.backup_dir)
+        timestamp = _backup_timestamp(int(time.time()))
+        stem = os.path.join(backup_dir, f"{os.path.basename(file_path)}.{timestamp}")
+        backup_path = f"{stem}.bak"
 
         try:
-            shutil.copy2(file_path, backup_path)
-            logger.info(f"Created backup: {backup_path}")
+            attempt = 0
+            while True:
+                try:
+                    method = self._write_backup(file_path, backup_path, file_stat, link_ok)
+                    break
+                except FileExistsError:
+                    # 同一秒内已有同名备份（可能是与某个文件共享数据的硬链接），换一个文件名
+                    attempt += 1
+                    backup_path = f"{stem}.{attempt}.bak"
+                except FileNotFoundError:
+                    # 备份目录由构造函数创建，只有被外部删除时才需要重新创建
+                    if os.path.isdir(backup_dir):
+                        raise
+                    os.makedirs(backup_dir, exist_ok=True)
+            logger.info("Created backup%s: %s", method, backup_path)
             return backup_path
         except Exception as e:
-            logger.error(f"Failed to create backup for {file_path}: {e}")
+            logger.error("Failed to create backup for %s: %s", file_path, e)
             return None
+
+    @staticmethod
+    def _write_backup(file_path: str, backup_path: str, file_stat: os.stat_result,
+                      link_ok: bool) -> str:
+        """写出新的备份文件，返回用于日志的备份方式说明；备份路径已存在时抛出 FileExistsError。"""
+        if stat.S_ISREG(file_stat.st_mode):
+            if link_ok:
+                try:
+                    os.link(file_path, backup_path)
+                    return " (hard link)"
+                except FileExistsError:
+                    raise
+                except OSError:
+                    # 跨文件系统、文件系统不支持硬链接或备份目录缺失
+                    pass
+            if _reflink(file_path, backup_path):
+                return " (reflink)"
+        _copy2(file_path, backup_path, file_stat, exclusive=True)
+        return ""
+
+    @staticmethod
+    def _discard_linked_backup(backup_path: Optional[str], file_path: str) -> None:
+        """
+        删除或替换文件失败时，丢弃与该文件共享数据的硬链接备份。
+
+        原文件没有变化，无需备份；留下的硬链接会随原文件之后的原地修改一起改变。
+        """
+        if backup_path is None:
+            return
+        try:
+            if os.path.samefile(backup_path, file_path):
+                os.unlink(backup_path)
+        except OSError:
+            pass
     
+    def _replace_file(self, file_path: str, content: str, encoding: str) -> int:
+        """
+        以“写临时文件再 rename”的方式原子地写入文件，返回文件大小。
+
+        读者只会看到完整的旧内容或新内容。原文件整体被替换而不是原地修改，
+        因此备份可以直接硬链接旧文件；原文件的权限位会复制到新文件上。
+        目标是符号链接时写入其指向的文件，链接本身保持不变。
+        """
+        try:
+            if os.path.islink(file_path):
+                file_path = os.path.realpath(file_path)
+            old_stat: Optional[os.stat_result] = os.stat(file_path)
+        except FileNotFoundError:
+            old_stat = None
+
+        tmp_path = _tmp_path(file_path)
+        backup_path: Optional[str] = None
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0), 0o666)
+        try:
+            # 写完后的位置就是文件大小，无需再 stat
+            with open(fd, 'w', encoding=encoding, buffering=_WRITE_BUFFER_SIZE) as f:
+                f.write(content)
+                size = f.tell()
+            if old_stat is not None:
+                os.chmod(tmp_path, stat.S_IMODE(old_stat.st_mode))
+                backup_path = self._create_backup(file_path, link_ok=True)
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            self._discard_linked_backup(backup_path, file_path)
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+        return size
+
     def create_file(self, path: str, content: str = "", encoding: str = "utf-8") -> Dict[str, Any]:
         """
         创建文件。
@@ -77,25 +490,21 @@ class FileManager:
             file_path = self._get_full_path(path)
             
             # 确保父目录存在
-            file_path.parent.mkdir(parents=True, exist_ok=True)
+            self._ensure_parent(file_path)
             
-            # 如果文件已存在，创建备份
-            if file_path.exists():
-                self._create_backup(file_path)
-            
-            # 写入文件
-            with open(file_path, 'w', encoding=encoding) as f:
-                f.write(content)
+            # 写入文件（已存在时先备份）
+            size = self._replace_file(file_path, content, encoding)
             
-            logger.info(f"Created file: {file_path}")
+            self._invalidate_listing()
+            logger.info("Created file: %s", file_path)
             return {
                 "success": True,
                 "message": f"File created successfully: {path}",
-                "path": str(file_path),
-                "size": file_path.stat().st_size
+                "path": file_path,
+                "size": size
             }
         except Exception as e:
-            logger.error(f"Failed to create file {path}: {e}")
+            logger.error("Failed to create file %s: %s", path, e)
             return {
                 "success": False,
                 "message": f"Failed to create file: {str(e)}",
@@ -116,33 +525,120 @@ class FileManager:
         try:
             file_path = self._get_full_path(path)
             
-            if not file_path.exists():
+            try:
+                size = os.stat(file_path).st_size
+            except OSError:
                 return {
                     "success": False,
                     "message": f"File not found: {path}",
                     "path": path
                 }
             
-            with open(file_path, 'r', encoding=encoding) as f:
-                content = f.read()
+            result = None
+            if size > _MMAP_THRESHOLD:
+                if _O_DIRECT and size > _DIRECT_IO_THRESHOLD:
+                    result = _read_direct(file_path, size, encoding)
+                if result is None:
+                    result = _read_mapped(file_path, encoding)
+            if result is None:
+                with open(file_path, 'r', encoding=encoding) as f:
+                    content = f.read()
+                    st = os.fstat(f.fileno())
+            else:
+                content, st = result
             
-            logger.info(f"Read file: {file_path}")
+            logger.info("Read file: %s", file_path)
             return {
                 "success": True,
                 "message": f"File read successfully: {path}",
-                "path": str(file_path),
+                "path": file_path,
                 "content": content,
-                "size": file_path.stat().st_size,
-                "modified": datetime.fromtimestamp(file_path.stat().st_mtime).isoformat()
+                "size": st.st_size,
+                "modified": datetime.fromtimestamp(st.st_mtime).isoformat()
             }
         except Exception as e:
-            logger.error(f"Failed to read file {path}: {e}")
+            logger.error("Failed to read file %s: %s", path, e)
             return {
                 "success": False,
                 "message": f"Failed to read file: {str(e)}",
                 "path": path
             }
 
+    @staticmethod
+    def _read_text(file_path: str, encoding: str) -> Tuple[str, os.stat_result]:
+        """
+        用 open/fstat/read/close 四次系统调用读取整个文本文件。
+
+        绕过 io.open 的缓冲层（它还会额外调用 isatty、lseek 等），
+        换行符按文本模式的规则统一转换为 \\n。
+        """
+        fd = os.open(file_path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+        try:
+            st = os.fstat(fd)
+            # 按 fstat 的大小多请求一个字节：读到的比请求的少且已够文件大小时即到达末尾，
+            # 省去再读一次确认 EOF；文件在 fstat 之后变长或出现短读时继续读
+            chunks = []
+            total = 0
+            want = st.st_size + 1
+            while True:
+                chunk = os.read(fd, want)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                total += len(chunk)
+                if len(chunk) < want and total >= st.st_size:
+                    break
+                want = 1 << 16
+        finally:
+            os.close(fd)
+
+        return _translate_newlines(b"".join(chunks).decode(encoding)), st
+
+    def read_many(self, paths: List[str], encoding: str = "utf-8") -> List[Dict[str, Any]]:
+        """
+        批量读取多个文件，结果格式与 read_file 相同。
+
+        Args:
+            paths: 文件路径列表
+            encoding: 文件编码
+
+        Returns:
+            与 paths 一一对应的结果字典；单个文件失败不影响其他文件
+        """
+        results = []
+        for path in paths:
+            file_path = self._get_full_path(path)
+            try:
+                content, st = self._read_text(file_path, encoding)
+            except FileNotFoundError:
+                results.append({
+                    "success": False,
+                    "message": f"File not found: {path}",
+                    "path": path
+                })
+                continue
+            except Exception as e:
+                logger.error("Failed to read file %s: %s", path, e)
+                results.append({
+                    "success": False,
+                    "message": f"Failed to read file: {str(e)}",
+                    "path": path
+                })
+                continue
+
+            results.append({
+                "success": True,
+                "message": f"File read successfully: {path}",
+                "path": file_path,
+                "content": content,
+                "size": st.st_size,
+                "modified": datetime.fromtimestamp(st.st_mtime).isoformat()
+            })
+
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("Read %d of %d files", sum(r['success'] for r in results), len(paths))
+        return results
+
     def write_file(self, path: str, content: str, encoding: str = "utf-8", append: bool = False) -> Dict[str, Any]:
         """
         写入文件内容。
@@ -160,26 +656,28 @@ class FileManager:
             file_path = self._get_full_path(path)
 
             # 确保父目录存在
-            file_path.parent.mkdir(parents=True, exist_ok=True)
+            self._ensure_parent(file_path)
 
-            # 如果文件已存在且不是追加模式，创建备份
-            if file_path.exists() and not append:
-                self._create_backup(file_path)
-
-            mode = 'a' if append else 'w'
-            with open(file_path, mode, encoding=encoding) as f:
-                f.write(content)
+            if append:
+                # 追加模式下写完后的位置同样是文件末尾，即文件大小
+                with open(file_path, 'a', encoding=encoding, buffering=_WRITE_BUFFER_SIZE) as f:
+                    f.write(content)
+                    size = f.tell()
+            else:
+                # 覆盖写入（已存在时先备份）
+                size = self._replace_file(file_path, content, encoding)
 
             action = "appended to" if append else "written to"
-            logger.info(f"Content {action} file: {file_path}")
+            self._invalidate_listing()
+            logger.info("Content %s file: %s", action, file_path)
             return {
                 "success": True,
                 "message": f"Content {action} file successfully: {path}",
-                "path": str(file_path),
-                "size": file_path.stat().st_size
+                "path": file_path,
+                "size": size
             }
         except Exception as e:
-            logger.error(f"Failed to write to file {path}: {e}")
+            logger.error("Failed to write to file %s: %s", path, e)
             return {
                 "success": False,
                 "message": f"Failed to write to file: {str(e)}",
@@ -199,7 +697,7 @@ class FileManager:
         try:
             file_path = self._get_full_path(path)
 
-            if not file_path.exists():
+            if not os.path.exists(file_path):
                 return {
                     "success": False,
                     "message": f"File not found: {path}",
@@ -207,24 +705,30 @@ class FileManager:
                 }
 
             # 创建备份
-            backup_path = self._create_backup(file_path)
+            # 原文件随后被删除，备份可以直接使用硬链接
+            backup_path = self._create_backup(file_path, link_ok=True)
 
             # 删除文件
-            file_path.unlink()
+            try:
+                os.unlink(file_path)
+            except OSError:
+                self._discard_linked_backup(backup_path, file_path)
+                raise
 
-            logger.info(f"Deleted file: {file_path}")
+            self._invalidate_listing()
+            logger.info("Deleted file: %s", file_path)
             result = {
                 "success": True,
                 "message": f"File deleted successfully: {path}",
-                "path": str(file_path)
+                "path": file_path
             }
 
             if backup_path:
-                result["backup"] = str(backup_path)
+                result["backup"] = backup_path
 
             return result
         except Exception as e:
-            logger.error(f"Failed to delete file {path}: {e}")
+            logger.error("Failed to delete file %s: %s", path, e)
             return {
                 "success": False,
                 "message": f"Failed to delete file: {str(e)}",
@@ -246,7 +750,9 @@ class FileManager:
             src_file = self._get_full_path(src_path)
             dst_file = self._get_full_path(dst_path)
 
-            if not src_file.exists():
+            try:
+                src_stat = os.stat(src_file)
+            except OSError:
                 return {
                     "success": False,
                     "message": f"Source file not found: {src_path}",
@@ -254,24 +760,50 @@ class FileManager:
                 }
 
             # 确保目标目录存在
-            dst_file.parent.mkdir(parents=True, exist_ok=True)
+            self._ensure_parent(dst_file)
 
-            # 如果目标文件已存在，创建备份
-            if dst_file.exists():
-                self._create_backup(dst_file)
+            try:
+                dst_stat = os.stat(dst_file)
+            except OSError:
+                dst_stat = None
+            if (dst_stat is not None and stat.S_ISDIR(dst_stat.st_mode)
+                    and not os.path.samestat(src_stat, dst_stat)):
+                # 与 shutil.move 一致：目标是目录时移动到该目录下，同名项已存在则报错
+                target = os.path.join(dst_file, os.path.basename(src_file))
+                if os.path.lexists(target):
+                    raise shutil.Error(f"Destination path '{target}' already exists")
+                dst_stat = None
+            else:
+                target = dst_file
+
+            # 如果目标文件已存在，创建备份。目标总是通过 rename 整体替换（跨文件系统时
+            # 也是先复制到目标旁的临时文件），可以使用硬链接
+            backup_path = None
+            if dst_stat is not None and not stat.S_ISDIR(dst_stat.st_mode):
+                backup_path = self._create_backup(target, link_ok=True)
 
-            # 移动文件
-            shutil.move(str(src_file), str(dst_file))
+            # 同一文件系统内只需一次 rename；跨文件系统时退回复制后删除
+            try:
+                try:
+                    os.replace(src_file, target)
+                except OSError as e:
+                    if e.errno != errno.EXDEV:
+                        raise
+                    self._move_across_devices(src_file, target)
+            except BaseException:
+                self._discard_linked_backup(backup_path, target)
+                raise
 
-            logger.info(f"Moved file from {src_file} to {dst_file}")
+            self._invalidate_listing()
+            logger.info("Moved file from %s to %s", src_file, target)
             return {
                 "success": True,
                 "message": f"File moved successfully from {src_path} to {dst_path}",
-                "src_path": str(src_file),
-                "dst_path": str(dst_file)
+                "src_path": src_file,
+                "dst_path": dst_file
             }
         except Exception as e:
-            logger.error(f"Failed to move file from {src_path} to {dst_path}: {e}")
+            logger.error("Failed to move file from %s to %s: %s", src_path, dst_path, e)
             return {
                 "success": False,
                 "message": f"Failed to move file: {str(e)}",
@@ -279,6 +811,30 @@ class FileManager:
                 "dst_path": dst_path
             }
 
+    @staticmethod
+    def _move_across_devices(src_file: str, dst_file: str) -> None:
+        """
+        跨文件系统移动：普通文件复制内容和元数据后删除源文件，其余交给 shutil.move。
+
+        内容先复制到目标旁的临时文件再 rename 到目标位置，已存在的目标被整体替换
+        而不是原地覆盖，指向旧目标的硬链接备份保持不变。
+        """
+        src_stat = os.lstat(src_file)
+        if not stat.S_ISREG(src_stat.st_mode):
+            shutil.move(src_file, dst_file)
+            return
+        tmp_path = _tmp_path(dst_file)
+        try:
+            _copy2(src_file, tmp_path, src_stat, exclusive=True)
+            os.replace(tmp_path, dst_file)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+        os.unlink(src_file)
+
     def copy_file(self, src_path: str, dst_path: str) -> Dict[str, Any]:
         """
         复制文件。
@@ -294,7 +850,10 @@ class FileManager:
             src_file = self._get_full_path(src_path)
             dst_file = self._get_full_path(dst_path)
 
-            if not src_file.exists():
+            # 复制保留源文件内容，源文件的 stat 结果即可给出副本大小
+            try:
+                src_stat = os.stat(src_file)
+            except OSError:
                 return {
                     "success": False,
                     "message": f"Source file not found: {src_path}",
@@ -302,25 +861,26 @@ class FileManager:
                 }
 
             # 确保目标目录存在
-            dst_file.parent.mkdir(parents=True, exist_ok=True)
+            self._ensure_parent(dst_file)
 
             # 如果目标文件已存在，创建备份
-            if dst_file.exists():
+            if os.path.exists(dst_file):
                 self._create_backup(dst_file)
 
             # 复制文件
-            shutil.copy2(str(src_file), str(dst_file))
+            _copy2(src_file, dst_file, src_stat)
 
-            logger.info(f"Copied file from {src_file} to {dst_file}")
+            self._invalidate_listing()
+            logger.info("Copied file from %s to %s", src_file, dst_file)
             return {
                 "success": True,
                 "message": f"File copied successfully from {src_path} to {dst_path}",
-                "src_path": str(src_file),
-                "dst_path": str(dst_file),
-                "size": dst_file.stat().st_size
+                "src_path": src_file,
+                "dst_path": dst_file,
+                "size": src_stat.st_size
             }
         except Exception as e:
-            logger.error(f"Failed to copy file from {src_path} to {dst_path}: {e}")
+            logger.error("Failed to copy file from %s to %s: %s", src_path, dst_path, e)
             return {
                 "success": False,
                 "message": f"Failed to copy file: {str(e)}",
@@ -340,22 +900,100 @@ class FileManager:
         """
         try:
             dir_path = self._get_full_path(path)
-            dir_path.mkdir(parents=True, exist_ok=True)
+            os.makedirs(dir_path, exist_ok=True)
 
-            logger.info(f"Created directory: {dir_path}")
+            self._invalidate_listing()
+            logger.info("Created directory: %s", dir_path)
             return {
                 "success": True,
                 "message": f"Directory created successfully: {path}",
-                "path": str(dir_path)
+                "path": dir_path
             }
         except Exception as e:
-            logger.error(f"Failed to create directory {path}: {e}")
+            logger.error("Failed to create directory %s: %s", path, e)
             return {
                 "success": False,
                 "message": f"Failed to create directory: {str(e)}",
                 "path": path
             }
 
+    def _entry_info(self, name: str, relative_path: str, st: os.stat_result,
+                    is_file: bool) -> Dict[str, Any]:
+        """根据一次 stat 的结果构造列表条目。"""
+        return {
+            "name": name,
+            "path": relative_path,
+            "size": st.st_size if is_file else None,
+            "modified": datetime.fromtimestamp(st.st_mtime).isoformat(),
+            "is_file": is_file,
+            "is_directory": not is_file
+        }
+
+    def _scan_entries(self, dir_path: str, pattern: str,
+                      recursive: bool) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        使用 os.scandir 列出目录条目，只对匹配模式的条目 stat 一次。
+
+        与 pathlib 的 glob/rglob 行为一致：跟随符号链接判断类型，
+        递归时不进入指向目录的符号链接。
+        """
+        files = []
+        directories = []
+        match = _compile_glob(pattern)
+        base = self._relative_to_workspace(dir_path)
+        stack = [(dir_path, "" if base == "." else base)]
+
+        while stack:
+            current, prefix = stack.pop()
+            try:
+                it = os.scandir(current)
+            except OSError:
+                if current == dir_path:
+                    raise
+                continue
+            with it:
+                for entry in it:
+                    name = entry.name
+                    relative_path = os.path.join(prefix, name) if prefix else name
+
+                    # 只有匹配的条目需要 stat 取大小和修改时间
+                    if match is None or match(name):
+                        try:
+                            st = entry.stat()
+                        except OSError:
+                            # 失效的符号链接等
+                            continue
+                        is_file = stat.S_ISREG(st.st_mode)
+                        if is_file or stat.S_ISDIR(st.st_mode):
+                            item_info = self._entry_info(name, relative_path, st, is_file)
+                            (files if is_file else directories).append(item_info)
+
+                    # 是否进入子目录由 readdir 返回的 d_type 判断，通常不需要额外的系统调用
+                    if recursive and entry.is_dir(follow_symlinks=False):
+                        stack.append((entry.path, relative_path))
+
+        return files, directories
+
+    def _glob_entries(self, dir_path: str, pattern: str,
+                      recursive: bool) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """使用 pathlib 的 glob 列出匹配条目。"""
+        files = []
+        directories = []
+        dir_path = Path(dir_path)
+        items = dir_path.rglob(pattern) if recursive else dir_path.glob(pattern)
+
+        for item in items:
+            st = item.stat()
+            is_dir = stat.S_ISDIR(st.st_mode)
+            is_file = stat.S_ISREG(st.st_mode)
+            if is_file or is_dir:
+                item_info = self._entry_info(item.name, str(item.relative_to(self.workspace)),
+                                             st, is_file)
+                (files if is_file else directories).append(item_info)
+
+        return files, directories
+
+    @_stat_memoize
     def list_files(self, path: str = ".", pattern: str = "*", recursive: bool = False) -> Dict[str, Any]:
         """
         列出目录中的文件和子目录。
@@ -371,58 +1009,107 @@ class FileManager:
         try:
             dir_path = self._get_full_path(path)
 
-            if not dir_path.exists():
+            # 一次 stat 同时判断是否存在以及是否为目录
+            try:
+                dir_mode = os.stat(dir_path).st_mode
+            except OSError:
                 return {
                     "success": False,
                     "message": f"Directory not found: {path}",
                     "path": path
                 }
 
-            if not dir_path.is_dir():
+            if not stat.S_ISDIR(dir_mode):
                 return {
                     "success": False,
                     "message": f"Path is not a directory: {path}",
                     "path": path
                 }
 
-            files = []
-            directories = []
-
-            if recursive:
-                items = dir_path.rglob(pattern)
+            if "/" in pattern or "**" in pattern:
+                # 含路径分隔符的模式交给 pathlib 处理
+                files, directories = self._glob_entries(dir_path, pattern, recursive)
             else:
-                items = dir_path.glob(pattern)
-
-            for item in items:
-                relative_path = item.relative_to(self.workspace)
-                item_info = {
-                    "name": item.name,
-                    "path": str(relative_path),
-                    "size": item.stat().st_size if item.is_file() else None,
-                    "modified": datetime.fromtimestamp(item.stat().st_mtime).isoformat(),
-                    "is_file": item.is_file(),
-                    "is_directory": item.is_dir()
-                }
-
-                if item.is_file():
-                    files.append(item_info)
-                elif item.is_dir():
-                    directories.append(item_info)
+                files, directories = self._scan_entries(dir_path, pattern, recursive)
 
-            logger.info(f"Listed {len(files)} files and {len(directories)} directories in {dir_path}")
+            logger.info("Listed %d files and %d directories in %s", len(files), len(directories), dir_path)
             return {
                 "success": True,
                 "message": f"Directory listing for: {path}",
-                "path": str(dir_path),
+                "path": dir_path,
                 "files": files,
                 "directories": directories,
                 "total_files": len(files),
                 "total_directories": len(directories)
             }
         except Exception as e:
-            logger.error(f"Failed to list directory {path}: {e}")
+            logger.error("Failed to list directory %s: %s", path, e)
             return {
                 "success": False,
                 "message": f"Failed to list directory: {str(e)}",
                 "path": path
             }
+
+    def batch_apply(self, ops: List[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """
+        依次执行一组文件操作，调用方可在一次线程切换中完成多项操作。
+
+        Args:
+            ops: (方法名, 参数字典) 列表，方法名须在 BATCH_OPERATIONS 中
+
+        Returns:
+            与 ops 一一对应的结果字典；单个操作失败不影响后续操作
+        """
+        return [self._apply(name, params) for name, params in ops]
+
+    def _apply(self, name: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """执行单个批量操作，异常转换为失败结果。"""
+        if name not in self.BATCH_OPERATIONS:
+            return {
+                "success": False,
+                "message": f"Unsupported operation: {name}"
+            }
+        try:
+            return getattr(self, name)(**params)
+        except Exception as e:
+            logger.error("Batch operation %s failed: %s", name, e)
+            return {
+                "success": False,
+                "message": f"Error - {str(e)}"
+            }
+
+    @staticmethod
+    async def _run_in_thread(func: Callable[..., Dict[str, Any]], *args: Any, **kwargs: Any) -> Dict[str, Any]:
+        """在默认线程池中执行阻塞的文件操作。"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(func, *args, **kwargs))
+
+    async def acreate_file(self, path: str, content: str = "", encoding: str = "utf-8") -> Dict[str, Any]:
+        """create_file 的异步版本，在线程池中执行。"""
+        return await self._run_in_thread(self.create_file, path, content, encoding)
+
+    async def aread_file(self, path: str, encoding: str = "utf-8") -> Dict[str, Any]:
+        """read_file 的异步版本，在线程池中执行。"""
+        return await self._run_in_thread(self.read_file, path, encoding)
+
+    async def awrite_file(self, path: str, content: str, encoding: str = "utf-8",
+                          append: bool = False) -> Dict[str, Any]:
+        """write_file 的异步版本，在线程池中执行。"""
+        return await self._run_in_thread(self.write_file, path, content, encoding, append)
+
+    async def abatch(self, ops: List[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """
+        并发执行一组文件操作，每个操作占用线程池中的一个线程。
+
+        各操作之间没有顺序保证，调用方应确保它们互不依赖（例如不涉及同一路径）；
+        有先后依赖的操作请使用 batch_apply。
+
+        Args:
+            ops: (方法名, 参数字典) 列表，方法名须在 BATCH_OPERATIONS 中
+
+        Returns:
+            与 ops 一一对应的结果字典
+        """
+        return list(await asyncio.gather(*(
+            self._run_in_thread(self._apply, name, params) for name, params in ops
+        )))
@@ -5,16 +5,21 @@ File Agent 安装脚本
 
 import os
 import sys
+import shlex
 import subprocess
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+# 当前解释器，所有子命令都用它执行，无需经过 shell 或 PATH 查找
+PYTHON = sys.executable
+
 
 def run_command(command, check=True):
-    """运行命令并返回结果。"""
-    print(f"执行: {command}")
+    """直接运行命令（参数列表，不经过 shell）并返回是否成功。"""
+    print(f"执行: {shlex.join(command)}")
     try:
-        result = subprocess.run(command, shell=True, check=check, capture_output=True, text=True)
+        result = subprocess.run(command, check=check, capture_output=True, text=True)
         if result.stdout:
             print(result.stdout)
         return result.returncode == 0
@@ -23,6 +28,9 @@ def run_command(command, check=True):
         if e.stderr:
             print(f"错误信息: {e.stderr}")
         return False
+    except OSError as e:
+        print(f"命令无法启动: {e}")
+        return False
 
 
 def check_python_version():
@@ -41,11 +49,11 @@ def install_dependencies():
     print("\n=== 安装依赖包 ===")
     
     # 升级pip
-    if not run_command(f"{sys.executable} -m pip install --upgrade pip"):
+    if not run_command([PYTHON, "-m", "pip", "install", "--upgrade", "pip"]):
         print("警告: pip升级失败，继续安装...")
     
     # 安装依赖
-    if not run_command(f"{sys.executable} -m pip install -r requirements.txt"):
+    if not run_command([PYTHON, "-m", "pip", "install", "-r", "requirements.txt"]):
         print("错误: 依赖安装失败")
         return False
     
@@ -53,6 +61,12 @@ def install_dependencies():
     return True
 
 
+def _make_directory(directory):
+    """创建单个目录（已存在时忽略），返回目录名。"""
+    Path(directory).mkdir(exist_ok=True)
+    return directory
+
+
 def create_directories():
     """创建必要的目录。"""
     print("\n=== 创建目录结构 ===")
@@ -64,10 +78,10 @@ def create_directories():
         "examples"
     ]
     
-    for directory in directories:
-        path = Path(directory)
-        path.mkdir(exist_ok=True)
-        print(f"✓ 创建目录: {directory}")
+    # 各目录互不依赖，并行创建；结果按原顺序输出
+    with ThreadPoolExecutor(max_workers=len(directories)) as executor:
+        for directory in executor.map(_make_directory, directories):
+            print(f"✓ 创建目录: {directory}")
     
     return True
 
@@ -93,7 +107,7 @@ def install_package():
     """安装包到系统。"""
     print("\n=== 安装File Agent包 ===")
     
-    if not run_command(f"{sys.executable} -m pip install -e ."):
+    if not run_command([PYTHON, "-m", "pip", "install", "-e", "."]):
         print("错误: 包安装失败")
         return False
     
@@ -105,7 +119,7 @@ def run_tests():
     """运行测试。"""
     print("\n=== 运行测试 ===")
     
-    if not run_command("python -m pytest tests/ -v", check=False):
+    if not run_command([PYTHON, "-m", "pytest", "tests/", "-v"], check=False):
         print("警告: 部分测试失败，但安装可以继续")
     else:
         print("✓ 所有测试通过")
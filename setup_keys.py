@@ -8,6 +8,29 @@ import yaml
 import getpass
 from pathlib import Path
 
+try:
+    # 优先使用 libyaml 的 C 实现
+    from yaml import CSafeLoader as _YamlLoader, CSafeDumper as _YamlDumper
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader, SafeDumper as _YamlDumper
+
+
+# 预先生成的掩码字符串，显示密钥时直接切片
+_STARS = '*' * 256
+
+
+def _mask_key(key):
+    """只显示密钥前 8 位，其余用 * 代替；不超过 8 位的密钥全部隐藏。"""
+    shown = key[:8] if len(key) > 8 else ''
+    hidden = len(key) - len(shown)
+    return shown + (_STARS[:hidden] if hidden <= len(_STARS) else '*' * hidden)
+
+
+def _load_yaml(path):
+    """读取并解析 YAML 文件，空文件返回空字典。"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return yaml.load(f, Loader=_YamlLoader) or {}
+
 
 def setup_api_keys():
     """交互式设置API密钥"""
@@ -25,8 +48,7 @@ def setup_api_keys():
         print("📁 发现现有的本地配置文件")
         choice = input("是否要更新现有配置？(y/N): ").lower().strip()
         if choice in ['y', 'yes']:
-            with open(local_config_path, 'r', encoding='utf-8') as f:
-                config = yaml.safe_load(f) or {}
+            config = _load_yaml(local_config_path)
         else:
             print("取消设置")
             return
@@ -70,7 +92,7 @@ def setup_api_keys():
         # 显示当前密钥状态
         current_key = config['api_keys'].get(provider_id, '')
         if current_key:
-            masked_key = current_key[:8] + '*' * (len(current_key) - 8) if len(current_key) > 8 else '*' * len(current_key)
+            masked_key = _mask_key(current_key)
             print(f"   当前密钥: {masked_key}")
         
         # 输入新密钥
@@ -117,7 +139,7 @@ def setup_api_keys():
     # 保存配置
     try:
         with open(local_config_path, 'w', encoding='utf-8') as f:
-            yaml.dump(config, f, default_flow_style=False, allow_unicode=True)
+            yaml.dump(config, f, Dumper=_YamlDumper, default_flow_style=False, allow_unicode=True)
         
         print(f"\n✅ 配置已保存到 {local_config_path}")
         print("🔒 此文件已被 .gitignore 忽略，不会被提交到版本控制")
@@ -148,8 +170,7 @@ def show_current_config():
         return
     
     try:
-        with open(local_config_path, 'r', encoding='utf-8') as f:
-            config = yaml.safe_load(f) or {}
+        config = _load_yaml(local_config_path)
         
         api_keys = config.get('api_keys', {})
         providers = ['openai', 'anthropic', 'google', 'deepseek']
@@ -157,7 +178,7 @@ def show_current_config():
         for provider in providers:
             key = api_keys.get(provider, '')
             if key:
-                masked_key = key[:8] + '*' * (len(key) - 8) if len(key) > 8 else '*' * len(key)
+                masked_key = _mask_key(key)
                 print(f"✅ {provider.ljust(10)}: {masked_key}")
             else:
                 print(f"❌ {provider.ljust(10)}: 未设置")
@@ -0,0 +1,431 @@
+"""
+Tests for the FileAgent class.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from file_agent.agent import FileAgent, _bind_args, _parse_args, _parse_execute_lines
+
+
+@pytest.fixture
+def agent(tmp_path):
+    """使用临时工作目录、不连接AI提供商的代理。"""
+    config_file = tmp_path / "config.yaml"
+    config_file.write_text(
+        "file_manager:\n"
+        f"  default_workspace: {tmp_path / 'workspace'}\n"
+        "  backup_enabled: false\n",
+        encoding="utf-8"
+    )
+    file_agent = FileAgent(str(config_file))
+    file_agent.ai_provider = None
+    return file_agent
+
+
+@pytest.fixture
+def ai_config_file(tmp_path):
+    """配置了 OpenAI 和 DeepSeek 密钥的配置文件，代理会创建真实的提供商（不发出请求）。"""
+    config_file = tmp_path / "config.yaml"
+    config_file.write_text(
+        "ai:\n"
+        "  default_provider: openai\n"
+        "  default_model: gpt-3.5-turbo\n"
+        "api_keys:\n"
+        "  openai: sk-test-openai\n"
+        "  deepseek: sk-test-deepseek\n"
+        "file_manager:\n"
+        f"  default_workspace: {tmp_path / 'workspace'}\n"
+        "  backup_enabled: false\n",
+        encoding="utf-8"
+    )
+    return config_file
+
+
+class _ChatHandler(BaseHTTPRequestHandler):
+    """本地的 OpenAI 兼容接口：对任意请求返回固定的对话补全。"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        body = json.dumps({
+            "id": "chatcmpl-test",
+            "object": "chat.completion",
+            "created": 0,
+            "model": "gpt-3.5-turbo",
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": "你好"}}],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def chat_server():
+    """在后台线程运行的本地对话接口，返回其 base URL。"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _ChatHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}/v1"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+class _FakeProvider:
+    """支持工具调用的AI提供商替身：记录请求参数，返回固定的响应。"""
+
+    supports_tools = True
+    supports_system_prompt = True
+
+    def __init__(self, response="", tool_calls=None):
+        self.response = response
+        self.tool_calls = tool_calls
+        self.requests = []
+
+    async def generate_response(self, prompt, **kwargs):
+        self.requests.append((prompt, kwargs))
+        return {
+            "success": True,
+            "response": self.response,
+            "model": "fake-model",
+            "usage": {"total_tokens": 1},
+            "tool_calls": self.tool_calls,
+        }
+
+    async def aclose(self):
+        pass
+
+
+# (用户输入, 期望的操作, 期望的参数)
+_PARSE_CASES = [
+    pytest.param('创建文件 "hello.py" 内容是"print(1)"', "create_file",
+                 {"path": "hello.py", "content": "print(1)"}, id="create_file_quoted_content"),
+    pytest.param("创建文件 'notes.txt' 内容是 hello world", "create_file",
+                 {"path": "notes.txt", "content": "hello world"}, id="create_file_free_content"),
+    pytest.param("创建文件 'empty.txt'", "create_file",
+                 {"path": "empty.txt", "content": ""}, id="create_file_no_content"),
+    pytest.param("创建文件 'README'", "ai_process",
+                 {"prompt": "创建文件 'README'"}, id="create_file_without_extension"),
+    # "文件夹" 同时包含 "文件"，创建文件的规则优先
+    pytest.param("创建文件夹 'notes.txt'", "create_file",
+                 {"path": "notes.txt", "content": ""}, id="folder_with_extension_creates_file"),
+    pytest.param("创建文件夹 'docs'", "ai_process",
+                 {"prompt": "创建文件夹 'docs'"}, id="folder_without_extension_falls_back"),
+    pytest.param("创建目录 'docs'", "create_directory",
+                 {"path": "docs"}, id="create_directory"),
+    pytest.param("创建目录 'src' 和文件 'main.py'", "create_file",
+                 {"path": "main.py", "content": ""}, id="file_rule_before_directory_rule"),
+    pytest.param("创建目录", "ai_process",
+                 {"prompt": "创建目录"}, id="create_directory_without_name"),
+    pytest.param("读取 'data.json'", "read_file",
+                 {"path": "data.json"}, id="read_file"),
+    pytest.param("查看 \"readme.md\"", "read_file",
+                 {"path": "readme.md"}, id="view_file"),
+    pytest.param("查看 'docs'", "ai_process",
+                 {"prompt": "查看 'docs'"}, id="read_without_extension_falls_back"),
+    pytest.param("读取并删除 'old.txt'", "read_file",
+                 {"path": "old.txt"}, id="read_rule_before_delete_rule"),
+    pytest.param("列出文件", "list_files",
+                 {"path": ".", "recursive": False}, id="list_files"),
+    pytest.param("递归显示所有文件", "list_files",
+                 {"path": ".", "recursive": True}, id="list_files_recursive"),
+    pytest.param("删除 'old.txt'", "delete_file",
+                 {"path": "old.txt"}, id="delete_file"),
+    pytest.param("删除这个文件", "ai_process",
+                 {"prompt": "删除这个文件"}, id="delete_without_name_falls_back"),
+    pytest.param("复制 'a.txt' 到 'b.txt'", "copy_file",
+                 {"src_path": "a.txt", "dst_path": "b.txt"}, id="copy_file"),
+    pytest.param("拷贝 'a.txt' 'dir' 'c.txt'", "copy_file",
+                 {"src_path": "a.txt", "dst_path": "c.txt"}, id="copy_skips_names_without_extension"),
+    pytest.param("拷贝 'a.txt'", "ai_process",
+                 {"prompt": "拷贝 'a.txt'"}, id="copy_single_file_falls_back"),
+    pytest.param("  帮我整理一下工作目录  ", "ai_process",
+                 {"prompt": "帮我整理一下工作目录"}, id="fallback_strips_input"),
+]
+
+
+class TestCommandParsing:
+    """命令解析测试类。"""
+
+    @pytest.mark.parametrize("text,operation,params", _PARSE_CASES)
+    def test_parse_command(self, agent, text, operation, params):
+        """测试每条命令规则及其回退到AI处理的情况。"""
+        command = agent._parse_command(text)
+
+        assert command == {"operation": operation, "params": params}
+
+    def test_parse_command_returns_fresh_params(self, agent):
+        """测试解析结果被缓存时，调用方修改返回的参数不会影响后续解析。"""
+        first = agent._parse_command("删除 'old.txt'")
+        first["params"]["path"] = "changed.txt"
+
+        assert agent._parse_command("删除 'old.txt'")["params"] == {"path": "old.txt"}
+
+    def test_file_operations_maps_to_file_manager(self, agent):
+        """测试 file_operations 提供操作名到文件管理器方法的映射。"""
+        operations = agent.file_operations
+
+        assert list(operations) == list(agent._OPERATION_NAMES)
+        assert operations["create_file"] == agent.file_manager.create_file
+        assert operations["list_files"](".")["success"] is True
+
+        operations.pop("create_file")
+        assert "create_file" in agent.file_operations
+
+
+class TestExecuteDirectives:
+    """AI响应中 EXECUTE 指令的解析测试类。"""
+
+    @pytest.mark.parametrize("text,expected", [
+        pytest.param('"a.txt", "hello"', ["a.txt", "hello"], id="double_quotes"),
+        pytest.param("'a.txt', 'hello'", ["a.txt", "hello"], id="single_quotes"),
+        pytest.param('"a, b.txt", "x,y"', ["a, b.txt", "x,y"], id="comma_inside_quotes"),
+        pytest.param('"say \\"hi\\"", \'it\\\'s\'', ['say "hi"', "it's"], id="escaped_quotes"),
+        pytest.param('"line1\\nline2\\tend", "c:\\\\dir"', ["line1\nline2\tend", "c:\\dir"],
+                     id="escape_sequences"),
+        pytest.param('"\\d+"', ["\\d+"], id="unknown_escape_kept"),
+        pytest.param("'it''s.txt'", ["its.txt"], id="adjacent_literals_concatenate"),
+        pytest.param('"print(\'(x)\')"', ["print('(x)')"], id="parens_inside_quotes"),
+        pytest.param(" . , *.py , true ", [".", "*.py", "true"], id="unquoted"),
+        pytest.param('"a.txt" junk, "b.txt"', ["a.txt", "b.txt"], id="stray_text_ignored"),
+        pytest.param('"unterminated', ["unterminated"], id="missing_closing_quote"),
+        pytest.param("", [], id="empty"),
+    ])
+    def test_parse_args(self, text, expected):
+        """测试参数拆分：引号、转义、引号内的逗号和括号。"""
+        assert _parse_args(text) == expected
+
+    def test_parse_execute_lines_multiple_directives(self):
+        """测试多条指令依次解析，并从文本中移除指令所在的行。"""
+        text = (
+            "好的，我来处理。\n"
+            'EXECUTE: create_file("a.py", "print((1, 2))")\n'
+            "EXECUTE: list_files(\".\", \"*.py\")  \n"
+            "完成。"
+        )
+
+        directives, remaining = _parse_execute_lines(text)
+
+        assert directives == [
+            ("create_file", '"a.py", "print((1, 2))"'),
+            ("list_files", '".", "*.py"'),
+        ]
+        assert remaining == "好的，我来处理。\n完成。"
+
+    def test_parse_execute_lines_nested_parens(self):
+        """测试引号外的嵌套括号按深度配对，引号内的括号不计入深度。"""
+        directives, _ = _parse_execute_lines('EXECUTE: write_file("f(1).txt", ")(")) 后续')
+
+        assert directives == [("write_file", '"f(1).txt", ")("')]
+
+    def test_parse_execute_lines_unclosed_directive_kept(self, caplog):
+        """测试缺少右括号的指令被忽略、保留在文本中，并记录调试日志。"""
+        text = 'EXECUTE: create_file("a.txt"\n其他内容'
+
+        with caplog.at_level(logging.DEBUG, logger="file_agent.agent"):
+            directives, remaining = _parse_execute_lines(text)
+
+        assert directives == []
+        assert remaining == text
+        assert "without closing parenthesis" in caplog.text
+
+    @pytest.mark.parametrize("operation,args,expected", [
+        pytest.param("create_file", ["a.txt"], {"path": "a.txt", "content": ""}, id="default_content"),
+        pytest.param("write_file", ["a.txt", "x", "True"], {"path": "a.txt", "content": "x", "append": True},
+                     id="bool_argument"),
+        pytest.param("list_files", [], {"path": ".", "pattern": "*", "recursive": False}, id="all_defaults"),
+        pytest.param("move_file", ["a.txt", "b.txt"], {"src_path": "a.txt", "dst_path": "b.txt"},
+                     id="two_paths"),
+    ])
+    def test_bind_args(self, operation, args, expected):
+        """测试位置参数按签名映射为关键字参数。"""
+        assert _bind_args(operation, args) == expected
+
+    @pytest.mark.parametrize("operation,args,message", [
+        pytest.param("rm_rf", ["/"], "unknown operation", id="unknown_operation"),
+        pytest.param("copy_file", ["a.txt"], "missing argument dst_path", id="missing_argument"),
+    ])
+    def test_bind_args_drops_invalid_directives(self, caplog, operation, args, message):
+        """测试未知操作和缺少必需参数的指令被丢弃，并记录调试日志。"""
+        with caplog.at_level(logging.DEBUG, logger="file_agent.agent"):
+            assert _bind_args(operation, args) is None
+
+        assert message in caplog.text
+
+
+class TestToolCalls:
+    """AI提供商以工具调用返回文件操作时的代理测试类。"""
+
+    @pytest.mark.asyncio(loop_scope="session")
+    async def test_tool_calls_run_file_operations(self, agent):
+        """测试工具调用映射到 FileManager 的同名操作并在同一次调用中执行。"""
+        agent.ai_provider = _FakeProvider("好的。", [
+            {"name": "create_directory", "arguments": {"path": "src"}},
+            {"name": "create_file", "arguments": {"path": "src/main.py", "content": "print(1)"}},
+            {"name": "read_file", "arguments": {"path": "src/main.py"}},
+        ])
+
+        result = await agent.execute("帮我建一个入口脚本")
+
+        workspace = agent.file_manager.workspace
+        assert (workspace / "src" / "main.py").read_text(encoding="utf-8") == "print(1)"
+        assert result["success"] is True
+        assert result["ai_model"] == "fake-model"
+        assert [line.split(":")[0] for line in result["executed_operations"]] == [
+            "✓ create_directory", "✓ create_file", "✓ read_file"
+        ]
+        assert result["message"].startswith("好的。\n\n执行的操作：\n")
+
+        prompt, kwargs = agent.ai_provider.requests[0]
+        assert prompt == "帮我建一个入口脚本"
+        assert {tool["name"] for tool in kwargs["tools"]} == set(agent._OPERATION_NAMES)
+
+    @pytest.mark.asyncio(loop_scope="session")
+    async def test_tool_calls_with_bad_arguments(self, agent):
+        """测试参数不是对象或操作未知的工具调用被报告为错误，其余操作照常执行。"""
+        agent.ai_provider = _FakeProvider(tool_calls=[
+            {"name": "create_file", "arguments": "a.txt"},
+            {"name": "format_disk", "arguments": {}},
+            {"name": "create_file", "arguments": {"path": "b.txt"}},
+        ])
+
+        result = await agent.execute("随便做点什么")
+
+        assert result["executed_operations"][:2] == [
+            "✗ create_file: Error - invalid arguments",
+            "✗ format_disk: Unknown operation",
+        ]
+        assert result["executed_operations"][2].startswith("✓ create_file")
+        assert not (agent.file_manager.workspace / "a.txt").exists()
+        assert (agent.file_manager.workspace / "b.txt").exists()
+
+    @pytest.mark.asyncio(loop_scope="session")
+    async def test_failed_tool_call_reported(self, agent):
+        """测试文件操作本身失败时摘要中带有 FileManager 返回的错误信息。"""
+        agent.ai_provider = _FakeProvider(tool_calls=[
+            {"name": "read_file", "arguments": {"path": "missing.txt"}},
+        ])
+
+        result = await agent.execute("读一下那个文件")
+
+        assert result["success"] is True
+        assert result["executed_operations"][0].startswith("✗ read_file: ")
+
+
+class TestOperationBatching:
+    """批量执行文件操作时的顺序与屏障测试类。"""
+
+    def test_same_path_operations_split_into_batches(self, agent):
+        """测试涉及相同或父子路径的操作拆到先后批次中，互不冲突的操作同批执行。"""
+        calls = [
+            (0, "create_file", {"path": "a.txt"}),
+            (1, "create_file", {"path": "b.txt"}),
+            (2, "write_file", {"path": "a.txt", "content": "x"}),
+            (3, "create_directory", {"path": "src"}),
+            (4, "create_file", {"path": "src/main.py"}),
+        ]
+
+        batches = agent._batch_operations(calls)
+
+        assert [[index for index, _, _ in batch] for batch in batches] == [[0, 1], [2, 3], [4]]
+
+    def test_list_files_is_a_barrier(self, agent):
+        """测试列出文件的操作单独成批，不与前后的操作并发。"""
+        calls = [
+            (0, "create_file", {"path": "a.txt"}),
+            (1, "list_files", {"path": "."}),
+            (2, "create_file", {"path": "b.txt"}),
+        ]
+
+        batches = agent._batch_operations(calls)
+
+        assert [[index for index, _, _ in batch] for batch in batches] == [[0], [1], [2]]
+
+    @pytest.mark.asyncio(loop_scope="session")
+    async def test_same_path_operations_keep_order(self, agent):
+        """测试同一路径上的操作按给出的顺序生效。"""
+        summaries = await agent._run_operations([
+            ("create_file", {"path": "log.txt", "content": "1"}),
+            ("write_file", {"path": "log.txt", "content": "2", "append": True}),
+            ("write_file", {"path": "log.txt", "content": "3", "append": True}),
+            ("copy_file", {"src_path": "log.txt", "dst_path": "copy.txt"}),
+            ("delete_file", {"path": "log.txt"}),
+        ])
+
+        workspace = agent.file_manager.workspace
+        assert all(summary.startswith("✓") for summary in summaries)
+        assert (workspace / "copy.txt").read_text(encoding="utf-8") == "123"
+        assert not (workspace / "log.txt").exists()
+
+    @pytest.mark.asyncio(loop_scope="session")
+    async def test_list_files_sees_files_created_before_it(self, agent):
+        """测试列出文件能看到之前的操作创建的文件，看不到之后创建的文件。"""
+        summaries = await agent._run_operations([
+            ("create_file", {"path": "a.txt"}),
+            ("create_file", {"path": "b.txt"}),
+            ("list_files", {"path": "."}),
+            ("create_file", {"path": "c.txt"}),
+        ])
+
+        assert summaries[2] == "✓ list_files: Found 2 files"
+        assert summaries[3].startswith("✓ create_file")
+
+
+class TestSharedHttpClient:
+    """同一代理创建的AI提供商共享HTTP连接池的测试类。"""
+
+    @pytest.mark.asyncio(loop_scope="session")
+    async def test_providers_share_one_client(self, ai_config_file):
+        """测试切换提供商后仍使用代理的同一个HTTP客户端，关闭代理时只关闭一次。"""
+        agent = FileAgent(str(ai_config_file))
+        first = agent.ai_provider
+        http_client = agent._http_client
+
+        agent.switch_model(provider="deepseek")
+        second = agent.ai_provider
+
+        assert http_client is not None
+        assert type(first).__name__ == "OpenAIProvider"
+        assert type(second).__name__ == "DeepSeekProvider"
+        assert first._http_client is http_client
+        assert second._http_client is http_client
+
+        # 提供商不关闭共享的客户端
+        await first.aclose()
+        assert not http_client.is_closed
+
+        await agent.aclose()
+        assert http_client.is_closed
+        assert agent._http_client is None
+        await agent.aclose()
+
+    def test_fresh_agent_per_event_loop(self, ai_config_file, chat_server, monkeypatch):
+        """测试每次 asyncio.run 使用新的代理时，连接池不会沿用已关闭的事件循环。"""
+        monkeypatch.setenv("OPENAI_BASE_URL", chat_server)
+
+        async def session():
+            agent = FileAgent(str(ai_config_file))
+            try:
+                return await agent.ai_provider.generate_response("你好")
+            finally:
+                await agent.aclose()
+
+        for _ in range(2):
+            response = asyncio.run(session())
+            assert response["success"] is True
+            assert response["response"] == "你好"
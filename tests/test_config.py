@@ -3,55 +3,58 @@ Tests for the Config class.
 """
 
 import pytest
-import tempfile
 import os
-from pathlib import Path
 
 from file_agent.config import Config
 
 
+# 测试中可能设置的环境变量，每个测试结束后清除
+_ENV_VARS = [
+    "OPENAI_API_KEY", "ANTHROPIC_API_KEY", "GOOGLE_API_KEY", "DEEPSEEK_API_KEY",
+    "AI_DEFAULT_PROVIDER", "FILE_MANAGER_DEFAULT_WORKSPACE",
+    "DEFAULT_AI_PROVIDER", "DEFAULT_WORKSPACE"
+]
+
+
+@pytest.fixture(autouse=True)
+def clean_env():
+    """测试结束后清理环境变量。"""
+    yield
+    for var in _ENV_VARS:
+        os.environ.pop(var, None)
+
+
+@pytest.fixture
+def config_file(tmp_path):
+    """测试用配置文件路径（默认不存在）。"""
+    return tmp_path / "test_config.yaml"
+
+
 class TestConfig:
     """Config测试类。"""
     
-    def setup_method(self):
-        """每个测试方法前的设置。"""
-        self.temp_dir = tempfile.mkdtemp()
-        self.config_file = Path(self.temp_dir) / "test_config.yaml"
-    
-    def teardown_method(self):
-        """每个测试方法后的清理。"""
-        # 清理环境变量
-        env_vars = [
-            "OPENAI_API_KEY", "ANTHROPIC_API_KEY", "GOOGLE_API_KEY", "DEEPSEEK_API_KEY",
-            "AI_DEFAULT_PROVIDER", "FILE_MANAGER_DEFAULT_WORKSPACE",
-            "DEFAULT_AI_PROVIDER", "DEFAULT_WORKSPACE"
-        ]
-        for var in env_vars:
-            if var in os.environ:
-                del os.environ[var]
-    
-    def test_default_config(self):
+    def test_default_config(self, config_file):
         """测试默认配置。"""
-        config = Config(str(self.config_file))
+        config = Config(str(config_file))
         
         # 测试默认值
         assert config.get("ai.default_provider") == "openai"
         assert config.get("ai.default_model") == "gpt-3.5-turbo"
         assert config.get("file_manager.backup_enabled") is True
     
-    def test_environment_variable_override(self):
+    def test_environment_variable_override(self, config_file):
         """测试环境变量覆盖。"""
         # 设置环境变量
         os.environ["AI_DEFAULT_PROVIDER"] = "anthropic"
         os.environ["FILE_MANAGER_DEFAULT_WORKSPACE"] = "/custom/workspace"
 
-        config = Config(str(self.config_file))
+        config = Config(str(config_file))
 
         # 环境变量应该覆盖默认值
         assert config.get("ai.default_provider") == "anthropic"
         assert config.get("file_manager.default_workspace") == "/custom/workspace"
     
-    def test_config_file_loading(self):
+    def test_config_file_loading(self, config_file):
         """测试配置文件加载。"""
         # 创建配置文件
         config_content = """
@@ -64,9 +67,9 @@ file_manager:
   default_workspace: ./custom_workspace
   backup_enabled: false
 """
-        self.config_file.write_text(config_content)
+        config_file.write_text(config_content)
         
-        config = Config(str(self.config_file))
+        config = Config(str(config_file))
         
         # 验证配置文件值被加载
         assert config.get("ai.default_provider") == "google"
@@ -74,9 +77,9 @@ file_manager:
         assert config.get("ai.max_tokens") == 2000
         assert config.get("file_manager.backup_enabled") is False
     
-    def test_set_and_save_config(self):
+    def test_set_and_save_config(self, config_file):
         """测试设置和保存配置。"""
-        config = Config(str(self.config_file))
+        config = Config(str(config_file))
         
         # 设置新值
         config.set("ai.default_provider", "anthropic")
@@ -86,18 +89,18 @@ file_manager:
         config.save_config()
         
         # 重新加载配置验证
-        new_config = Config(str(self.config_file))
+        new_config = Config(str(config_file))
         assert new_config.get("ai.default_provider") == "anthropic"
         assert new_config.get("ai.custom_setting") == "test_value"
     
-    def test_get_ai_config(self):
+    def test_get_ai_config(self, config_file):
         """测试获取AI配置。"""
         # 设置环境变量
         os.environ["OPENAI_API_KEY"] = "test_openai_key"
         os.environ["ANTHROPIC_API_KEY"] = "test_anthropic_key"
         os.environ["DEEPSEEK_API_KEY"] = "test_deepseek_key"
         
-        config = Config(str(self.config_file))
+        config = Config(str(config_file))
         ai_config = config.get_ai_config()
         
         assert ai_config["provider"] == "openai"
@@ -106,9 +109,9 @@ file_manager:
         assert ai_config["api_keys"]["anthropic"] == "test_anthropic_key"
         assert ai_config["api_keys"]["deepseek"] == "test_deepseek_key"
     
-    def test_get_file_manager_config(self):
+    def test_get_file_manager_config(self, config_file):
         """测试获取文件管理器配置。"""
-        config = Config(str(self.config_file))
+        config = Config(str(config_file))
         fm_config = config.get_file_manager_config()
         
         assert "workspace" in fm_config
@@ -116,20 +119,34 @@ file_manager:
         assert "backup_dir" in fm_config
         assert "max_file_size_mb" in fm_config
     
-    def test_validate_config_valid(self):
+    def test_get_config_returns_copies(self, config_file):
+        """测试修改返回的配置字典不会影响配置对象。"""
+        config = Config(str(config_file))
+        ai_config = config.get_ai_config()
+        fm_config = config.get_file_manager_config()
+        
+        ai_config["model"] = "changed"
+        ai_config["api_keys"]["openai"] = "changed"
+        fm_config["backup_enabled"] = "changed"
+        
+        assert config.get_ai_config()["model"] == "gpt-3.5-turbo"
+        assert config.get_ai_config()["api_keys"]["openai"] != "changed"
+        assert config.get_file_manager_config()["backup_enabled"] != "changed"
+    
+    def test_validate_config_valid(self, config_file):
         """测试有效配置验证。"""
         # 设置有效的API密钥
         os.environ["OPENAI_API_KEY"] = "test_key"
         
-        config = Config(str(self.config_file))
+        config = Config(str(config_file))
         validation = config.validate_config()
         
         assert validation["valid"] is True
         assert len(validation["issues"]) == 0
     
-    def test_validate_config_invalid_provider(self):
+    def test_validate_config_invalid_provider(self, config_file):
         """测试无效提供商配置验证。"""
-        config = Config(str(self.config_file))
+        config = Config(str(config_file))
         config.set("ai.default_provider", "invalid_provider")
         
         validation = config.validate_config()
@@ -137,7 +154,7 @@ file_manager:
         assert validation["valid"] is False
         assert any("Invalid AI provider" in issue for issue in validation["issues"])
     
-    def test_validate_config_missing_api_key(self):
+    def test_validate_config_missing_api_key(self, config_file):
         """测试缺少API密钥的配置验证。"""
         # 保存原始环境变量
         original_env = {}
@@ -149,7 +166,7 @@ file_manager:
                 del os.environ[key]
 
         try:
-            config = Config(str(self.config_file))
+            config = Config(str(config_file))
             validation = config.validate_config()
 
             assert validation["valid"] is False
@@ -159,9 +176,9 @@ file_manager:
             for key, value in original_env.items():
                 os.environ[key] = value
     
-    def test_nested_key_access(self):
+    def test_nested_key_access(self, config_file):
         """测试嵌套键访问。"""
-        config = Config(str(self.config_file))
+        config = Config(str(config_file))
         
         # 设置嵌套值
         config.set("deep.nested.key", "nested_value")
@@ -171,3 +188,46 @@ file_manager:
         
         # 测试不存在的嵌套键
         assert config.get("deep.nonexistent.key", "default") == "default"
+    
+    def test_set_invalidates_cached_value(self, config_file):
+        """测试 set() 后不会返回缓存的旧值。"""
+        config = Config(str(config_file))
+        
+        assert config.get("ai.default_model") == "gpt-3.5-turbo"
+        assert config.get("ai.missing", "fallback") == "fallback"
+        
+        config.set("ai.default_model", "gpt-4")
+        config.set("ai.missing", "present")
+        
+        assert config.get("ai.default_model") == "gpt-4"
+        assert config.get("ai.missing", "fallback") == "present"
+    
+    def test_parsed_file_cache(self, config_file):
+        """测试配置文件解析缓存：实例间互不影响，文件修改后重新解析。"""
+        config_file.write_text("ai:\n  default_model: gemini-pro\n")
+        
+        first = Config(str(config_file))
+        first.set("ai.default_model", "changed")
+        
+        # set() 修改的是副本，不影响缓存的解析结果
+        second = Config(str(config_file))
+        assert second.get("ai.default_model") == "gemini-pro"
+        
+        config_file.write_text("ai:\n  default_model: gpt-4\n")
+        stat = config_file.stat()
+        os.utime(config_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+        
+        third = Config(str(config_file))
+        assert third.get("ai.default_model") == "gpt-4"
+    
+    def test_api_keys_refresh_on_set(self, config_file):
+        """测试只有修改 api_keys 分组时才重新解析API密钥。"""
+        os.environ.pop("DEEPSEEK_API_KEY", None)
+        config = Config(str(config_file))
+        api_keys = config._resolve_api_keys()
+        
+        config.set("ai.default_model", "gpt-4")
+        assert config._resolve_api_keys() is api_keys
+        
+        config.set("api_keys.deepseek", "sk-local")
+        assert config.get_ai_config()["api_keys"]["deepseek"] == "sk-local"
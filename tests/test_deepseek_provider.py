@@ -4,87 +4,163 @@ Tests for the DeepSeek AI provider.
 
 import pytest
 import os
-from unittest.mock import Mock, patch
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, Mock, patch
 
+from file_agent import ai_providers
 from file_agent.ai_providers import DeepSeekProvider, AIProviderFactory
 
 
+API_KEY = "test_deepseek_api_key"
+MODEL = "deepseek-chat"
+
+# 成功响应的固定样本，模块导入时构造一次，各测试共用
+_CANONICAL_OK_RESPONSE = SimpleNamespace(
+    choices=[SimpleNamespace(message=SimpleNamespace(content="Test response"))],
+    usage=SimpleNamespace(prompt_tokens=10, completion_tokens=20, total_tokens=30)
+)
+
+# 模拟缺少 openai 包时导入抛出的异常，只创建一次
+_IMPORT_ERROR = ImportError("No module named 'openai'")
+
+
+def _raise_import_error(*args, **kwargs):
+    raise _IMPORT_ERROR
+
+
+class _StubClient:
+    """AsyncOpenAI 客户端的最小替身：记录请求参数，返回固定响应或抛出指定异常。"""
+
+    def __init__(self, response=None, exc=None):
+        self.response = response
+        self.exc = exc
+        self.requests = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, **kwargs):
+        self.requests.append(kwargs)
+        if self.exc is not None:
+            raise self.exc
+        return self.response
+
+
+@pytest.fixture(scope="module", autouse=True)
+def mock_openai():
+    """整个模块共用一次 openai.AsyncOpenAI 的替换，返回模拟的客户端类。"""
+    # 直接替换模块属性，比 patch() 的启动/恢复开销小
+    import openai
+    original = openai.AsyncOpenAI
+    mock_cls = Mock()
+    openai.AsyncOpenAI = mock_cls
+    try:
+        yield mock_cls
+    finally:
+        openai.AsyncOpenAI = original
+
+
+@pytest.fixture(scope="module")
+def provider(mock_openai):
+    """模块内共用的 DeepSeek 提供商，客户端是模拟对象；测试各自设置 create 的行为。"""
+    return DeepSeekProvider(API_KEY, MODEL)
+
+
+@pytest.fixture(scope="session")
+def supported_providers():
+    """支持的提供商列表，结果固定，整个测试会话只查询一次。"""
+    return AIProviderFactory.get_supported_providers()
+
+
 class TestDeepSeekProvider:
     """DeepSeek提供商测试类。"""
     
-    def setup_method(self):
-        """每个测试方法前的设置。"""
-        self.api_key = "test_deepseek_api_key"
-        self.model = "deepseek-chat"
-    
-    def test_init_success(self):
+    def test_init_success(self, mock_openai):
         """测试DeepSeek提供商初始化成功。"""
-        with patch('openai.OpenAI') as mock_openai:
-            provider = DeepSeekProvider(self.api_key, self.model)
-            
-            assert provider.api_key == self.api_key
-            assert provider.model == self.model
-            
-            # 验证OpenAI客户端使用正确的base_url
-            mock_openai.assert_called_once_with(
-                api_key=self.api_key,
-                base_url="https://api.deepseek.com"
-            )
+        provider = DeepSeekProvider(API_KEY, MODEL)
+        
+        assert provider.api_key == API_KEY
+        assert provider.model == MODEL
+        
+        # 验证异步OpenAI客户端使用正确的base_url
+        mock_openai.assert_called_with(
+            api_key=API_KEY,
+            base_url="https://api.deepseek.com",
+            http_client=None
+        )
     
     def test_init_missing_openai(self):
         """测试缺少openai包时的错误处理。"""
-        with patch('builtins.__import__', side_effect=ImportError):
+        # 清除已缓存的 openai 模块，使初始化重新执行导入
+        with patch.object(ai_providers, '_openai', None), \
+                patch('builtins.__import__', side_effect=_raise_import_error):
             with pytest.raises(ImportError, match="openai package is required"):
-                DeepSeekProvider(self.api_key, self.model)
+                DeepSeekProvider(API_KEY, MODEL)
     
-    @pytest.mark.asyncio
-    async def test_generate_response_success(self):
+    @pytest.mark.asyncio(loop_scope="session")
+    async def test_generate_response_success(self, provider):
         """测试成功生成响应。"""
-        with patch('openai.OpenAI') as mock_openai:
-            # 模拟API响应
-            mock_response = Mock()
-            mock_response.choices = [Mock()]
-            mock_response.choices[0].message.content = "Test response"
-            mock_response.usage.prompt_tokens = 10
-            mock_response.usage.completion_tokens = 20
-            mock_response.usage.total_tokens = 30
-            
-            mock_client = Mock()
-            mock_client.chat.completions.create.return_value = mock_response
-            mock_openai.return_value = mock_client
-            
-            provider = DeepSeekProvider(self.api_key, self.model)
-            result = await provider.generate_response("Test prompt")
-            
-            assert result["success"] is True
-            assert result["response"] == "Test response"
-            assert result["model"] == self.model
-            assert result["usage"]["total_tokens"] == 30
+        provider.client = _StubClient(response=_CANONICAL_OK_RESPONSE)
+        
+        result = await provider.generate_response("Test prompt")
+        
+        assert result["success"] is True
+        assert result["response"] == "Test response"
+        assert result["model"] == MODEL
+        assert result["usage"]["total_tokens"] == 30
     
-    @pytest.mark.asyncio
-    async def test_generate_response_error(self):
+    @pytest.mark.asyncio(loop_scope="session")
+    async def test_generate_response_tool_calls(self, provider):
+        """测试工具调用的请求与解析。"""
+        tool_call = SimpleNamespace(function=SimpleNamespace(
+            name="create_file",
+            arguments='{"path": "test.py", "content": "print(1)"}'
+        ))
+        response = SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=None, tool_calls=[tool_call]))],
+            usage=_CANONICAL_OK_RESPONSE.usage
+        )
+        provider.client = _StubClient(response=response)
+        
+        tools = [{"name": "create_file", "description": "创建文件", "parameters": {"type": "object"}}]
+        result = await provider.generate_response("Test prompt", tools=tools)
+        
+        request = provider.client.requests[-1]
+        assert request["tools"] == [{"type": "function", "function": tools[0]}]
+        assert result["success"] is True
+        assert result["tool_calls"] == [
+            {"name": "create_file", "arguments": {"path": "test.py", "content": "print(1)"}}
+        ]
+    
+    @pytest.mark.asyncio(loop_scope="session")
+    async def test_generate_response_error(self, provider):
         """测试API错误处理。"""
-        with patch('openai.OpenAI') as mock_openai:
-            mock_client = Mock()
-            mock_client.chat.completions.create.side_effect = Exception("API Error")
-            mock_openai.return_value = mock_client
-            
-            provider = DeepSeekProvider(self.api_key, self.model)
-            result = await provider.generate_response("Test prompt")
-            
-            assert result["success"] is False
-            assert "API Error" in result["error"]
-            assert result["model"] == self.model
+        provider.client = _StubClient(exc=Exception("API Error"))
+        
+        result = await provider.generate_response("Test prompt")
+        
+        assert result["success"] is False
+        assert result["error"] == "API Error"
+        assert result["model"] == MODEL
+    
+    @pytest.mark.asyncio(loop_scope="session")
+    async def test_aclose_closes_client(self):
+        """测试关闭提供商时关闭自己的客户端，且不影响其他提供商。"""
+        first = DeepSeekProvider(API_KEY, MODEL)
+        second = DeepSeekProvider(API_KEY, MODEL)
+        first.client = Mock(close=AsyncMock())
+        second.client = Mock(close=AsyncMock())
+        
+        await first.aclose()
+        
+        first.client.close.assert_awaited_once_with()
+        second.client.close.assert_not_awaited()
     
-    def test_get_available_models(self):
+    def test_get_available_models(self, provider):
         """测试获取可用模型列表。"""
-        with patch('openai.OpenAI'):
-            provider = DeepSeekProvider(self.api_key, self.model)
-            models = provider.get_available_models()
-            
-            assert "deepseek-chat" in models
-            assert "deepseek-coder" in models
-            assert len(models) >= 2
+        models = provider.get_available_models()
+        
+        assert "deepseek-chat" in models
+        assert "deepseek-coder" in models
+        assert len(models) >= 2
 
 
 class TestAIProviderFactoryWithDeepSeek:
@@ -92,33 +168,26 @@ class TestAIProviderFactoryWithDeepSeek:
     
     def test_create_deepseek_provider(self):
         """测试创建DeepSeek提供商。"""
-        with patch('openai.OpenAI'):
-            provider = AIProviderFactory.create_provider(
-                "deepseek", 
-                "test_api_key"
-            )
-            
-            assert isinstance(provider, DeepSeekProvider)
-            assert provider.api_key == "test_api_key"
-            assert provider.model == "deepseek-chat"  # 默认模型
+        provider = AIProviderFactory.create_provider(
+            "deepseek", 
+            "test_api_key"
+        )
+        
+        assert isinstance(provider, DeepSeekProvider)
+        assert provider.api_key == "test_api_key"
+        assert provider.model == "deepseek-chat"  # 默认模型
     
     def test_create_deepseek_provider_with_custom_model(self):
         """测试创建DeepSeek提供商并指定模型。"""
-        with patch('openai.OpenAI'):
-            provider = AIProviderFactory.create_provider(
-                "deepseek", 
-                "test_api_key", 
-                "deepseek-coder"
-            )
-            
-            assert isinstance(provider, DeepSeekProvider)
-            assert provider.model == "deepseek-coder"
+        provider = AIProviderFactory.create_provider(
+            "deepseek", 
+            "test_api_key", 
+            "deepseek-coder"
+        )
+        
+        assert isinstance(provider, DeepSeekProvider)
+        assert provider.model == "deepseek-coder"
     
-    def test_get_supported_providers_includes_deepseek(self):
+    def test_get_supported_providers_includes_deepseek(self, supported_providers):
         """测试支持的提供商列表包含DeepSeek。"""
-        providers = AIProviderFactory.get_supported_providers()
-        
-        assert "deepseek" in providers
-        assert "openai" in providers
-        assert "anthropic" in providers
-        assert "google" in providers
+        assert {"deepseek", "openai", "anthropic", "google"} <= set(supported_providers)
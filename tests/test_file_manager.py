@@ -2,190 +2,390 @@
 Tests for the FileManager class.
 """
 
+import errno
+import os
+import threading
 import pytest
-import tempfile
-import shutil
-from pathlib import Path
 
+from file_agent import file_manager
 from file_agent.file_manager import FileManager
 
 
+@pytest.fixture
+def workspace(tmp_path):
+    """测试用工作目录（由 FileManager 创建）。"""
+    return tmp_path / "workspace"
+
+
+@pytest.fixture
+def fm(request, tmp_path, workspace):
+    """
+    每个测试独立的 FileManager，目录由 pytest 的 tmp_path 统一清理。
+
+    默认关闭备份；需要检查备份的测试用 indirect 参数化传入 True。
+    """
+    manager = FileManager(workspace=str(workspace), backup_enabled=getattr(request, "param", False))
+    manager.backup_dir = tmp_path / "backups"
+    return manager
+
+
+@pytest.fixture(scope="class")
+def populated_fm(tmp_path_factory):
+    """列表测试共用的只读目录：三个文件和一个子目录，每个测试类只创建一次。"""
+    root = tmp_path_factory.mktemp("listing")
+    manager = FileManager(workspace=str(root / "workspace"), backup_enabled=False)
+    manager.create_file("file1.txt", "content1")
+    manager.create_file("file2.py", "content2")
+    manager.create_file("readme.md", "content")
+    manager.create_directory("subdir")
+    return manager
+
+
+def _check_create(fm, workspace, result):
+    assert "test.txt" in result["message"]
+    
+    # 验证文件确实被创建
+    file_path = workspace / "test.txt"
+    assert file_path.exists()
+    assert file_path.read_bytes() == b"Hello, World!"
+
+
+def _check_read(fm, workspace, result):
+    assert result["content"] == "Test content for reading"
+    assert "size" in result
+    assert "modified" in result
+
+
+def _check_write(fm, workspace, result):
+    assert fm.read_file("write_test.txt")["content"] == "New content"
+
+
+def _check_append(fm, workspace, result):
+    content = fm.read_file("append_test.txt")["content"]
+    assert "Initial content" in content
+    assert "Appended content" in content
+
+
+def _check_move(fm, workspace, result):
+    # 验证源文件不存在，目标文件存在
+    source_path = workspace / "source.txt"
+    dest_path = workspace / "destination.txt"
+    
+    assert not source_path.exists()
+    assert dest_path.exists()
+    assert dest_path.read_bytes() == b"Content to move"
+
+
+def _check_copy(fm, workspace, result):
+    # 验证两个文件都存在且内容相同
+    original_path = workspace / "original.txt"
+    copy_path = workspace / "copy.txt"
+    
+    assert original_path.exists()
+    assert copy_path.exists()
+    assert original_path.read_bytes() == copy_path.read_bytes() == b"Content to copy"
+
+
+# (准备操作, 被测操作, 参数, 结果检查)，操作格式与 batch_apply 相同
+_FILE_OPERATION_CASES = [
+    pytest.param([], "create_file", {"path": "test.txt", "content": "Hello, World!"},
+                 _check_create, id="create_file"),
+    pytest.param([("create_file", {"path": "read_test.txt", "content": "Test content for reading"})],
+                 "read_file", {"path": "read_test.txt"}, _check_read, id="read_file"),
+    pytest.param([], "write_file", {"path": "write_test.txt", "content": "New content"},
+                 _check_write, id="write_file"),
+    pytest.param([("create_file", {"path": "append_test.txt", "content": "Initial content"})],
+                 "write_file", {"path": "append_test.txt", "content": "\nAppended content", "append": True},
+                 _check_append, id="append_file"),
+    pytest.param([("create_file", {"path": "source.txt", "content": "Content to move"})],
+                 "move_file", {"src_path": "source.txt", "dst_path": "destination.txt"},
+                 _check_move, id="move_file"),
+    pytest.param([("create_file", {"path": "original.txt", "content": "Content to copy"})],
+                 "copy_file", {"src_path": "original.txt", "dst_path": "copy.txt"},
+                 _check_copy, id="copy_file"),
+]
+
+
 class TestFileManager:
     """FileManager测试类。"""
     
-    def setup_method(self):
-        """每个测试方法前的设置。"""
-        self.temp_dir = tempfile.mkdtemp()
-        self.workspace = Path(self.temp_dir) / "workspace"
-        self.backup_dir = Path(self.temp_dir) / "backups"
+    @pytest.mark.parametrize("setup,op,params,check", _FILE_OPERATION_CASES)
+    def test_file_operation(self, fm, workspace, setup, op, params, check):
+        """测试基本文件操作：依次执行准备操作，再执行被测操作并检查结果。"""
+        for name, setup_params in setup:
+            assert getattr(fm, name)(**setup_params)["success"] is True
         
-        self.file_manager = FileManager(
-            workspace=str(self.workspace),
-            backup_enabled=True
-        )
-        self.file_manager.backup_dir = self.backup_dir
-    
-    def teardown_method(self):
-        """每个测试方法后的清理。"""
-        if Path(self.temp_dir).exists():
-            shutil.rmtree(self.temp_dir)
-    
-    def test_create_file(self):
-        """测试文件创建。"""
-        result = self.file_manager.create_file("test.txt", "Hello, World!")
+        result = getattr(fm, op)(**params)
         
         assert result["success"] is True
-        assert "test.txt" in result["message"]
-        
-        # 验证文件确实被创建
-        file_path = self.workspace / "test.txt"
-        assert file_path.exists()
-        assert file_path.read_text() == "Hello, World!"
+        check(fm, workspace, result)
     
-    def test_read_file(self):
-        """测试文件读取。"""
-        # 先创建一个文件
-        test_content = "Test content for reading"
-        self.file_manager.create_file("read_test.txt", test_content)
+    @pytest.mark.parametrize("fm", [True], indirect=True)
+    def test_delete_file(self, fm, workspace):
+        """测试文件删除。"""
+        fm.create_file("delete_test.txt", "To be deleted")
         
-        # 读取文件
-        result = self.file_manager.read_file("read_test.txt")
+        result = fm.delete_file("delete_test.txt")
         
         assert result["success"] is True
-        assert result["content"] == test_content
-        assert "size" in result
-        assert "modified" in result
+        assert "backup" in result  # 应该有备份信息
+        
+        # 验证文件被删除
+        assert not (workspace / "delete_test.txt").exists()
     
-    def test_read_nonexistent_file(self):
+    def test_read_nonexistent_file(self, fm):
         """测试读取不存在的文件。"""
-        result = self.file_manager.read_file("nonexistent.txt")
+        result = fm.read_file("nonexistent.txt")
         
         assert result["success"] is False
-        assert "not found" in result["message"].lower()
+        assert result["message"] == "File not found: nonexistent.txt"
     
-    def test_write_file(self):
-        """测试文件写入。"""
-        content = "New content"
-        result = self.file_manager.write_file("write_test.txt", content)
+    def test_create_directory(self, fm, workspace):
+        """测试目录创建。"""
+        result = fm.create_directory("test_dir")
         
         assert result["success"] is True
         
-        # 验证内容
-        read_result = self.file_manager.read_file("write_test.txt")
-        assert read_result["content"] == content
+        # 验证目录被创建
+        dir_path = workspace / "test_dir"
+        assert dir_path.exists()
+        assert dir_path.is_dir()
     
-    def test_append_file(self):
-        """测试文件追加。"""
-        # 先创建文件
-        self.file_manager.create_file("append_test.txt", "Initial content")
-        
-        # 追加内容
-        result = self.file_manager.write_file("append_test.txt", "\nAppended content", append=True)
+    def test_list_files(self, populated_fm):
+        """测试文件列表。"""
+        result = populated_fm.list_files()
         
         assert result["success"] is True
+        assert result["total_files"] == 3
+        assert result["total_directories"] == 1
         
-        # 验证内容
-        read_result = self.file_manager.read_file("append_test.txt")
-        assert "Initial content" in read_result["content"]
-        assert "Appended content" in read_result["content"]
-    
-    def test_delete_file(self):
-        """测试文件删除。"""
-        # 先创建文件
-        self.file_manager.create_file("delete_test.txt", "To be deleted")
+        # 检查文件名
+        file_names = [f["name"] for f in result["files"]]
+        assert "file1.txt" in file_names
+        assert "file2.py" in file_names
+        assert "readme.md" in file_names
         
-        # 删除文件
-        result = self.file_manager.delete_file("delete_test.txt")
+        # 检查目录名
+        dir_names = [d["name"] for d in result["directories"]]
+        assert "subdir" in dir_names
+    
+    def test_list_files_with_pattern(self, populated_fm):
+        """测试带模式的文件列表。"""
+        # 只列出.txt文件
+        result = populated_fm.list_files(pattern="*.txt")
         
         assert result["success"] is True
-        assert "backup" in result  # 应该有备份信息
-        
-        # 验证文件被删除
-        file_path = self.workspace / "delete_test.txt"
-        assert not file_path.exists()
+        assert result["total_files"] == 1
+        assert result["files"][0]["name"] == "file1.txt"
     
-    def test_move_file(self):
-        """测试文件移动。"""
-        # 先创建文件
-        content = "Content to move"
-        self.file_manager.create_file("source.txt", content)
+    def test_list_files_cache_invalidation(self, fm, workspace):
+        """测试列表缓存在目录变化后失效。"""
+        fm.create_file("a.txt", "content")
+        first = fm.list_files()
+        assert first["total_files"] == 1
         
-        # 移动文件
-        result = self.file_manager.move_file("source.txt", "destination.txt")
+        # 通过管理器修改会清空缓存
+        fm.create_file("b.txt", "content")
+        assert fm.list_files()["total_files"] == 2
         
-        assert result["success"] is True
+        # 外部新增文件：显式推进目录 mtime，避免依赖时间戳精度
+        mtime_ns = os.stat(workspace).st_mtime_ns
+        (workspace / "c.txt").write_text("external")
+        os.utime(workspace, ns=(mtime_ns + 10**9, mtime_ns + 10**9))
+        assert fm.list_files()["total_files"] == 3
+        
+        # 调用方修改返回结果不会影响缓存
+        result = fm.list_files()
+        result["extra"] = True
+        assert "extra" not in fm.list_files()
+    
+    def test_list_files_cached_entries_are_copies(self, fm):
+        """测试修改返回的文件列表和条目不会影响缓存的结果。"""
+        fm.create_file("a.txt", "content")
+        fm.create_directory("sub")
+        result = fm.list_files()
         
-        # 验证源文件不存在，目标文件存在
-        source_path = self.workspace / "source.txt"
-        dest_path = self.workspace / "destination.txt"
+        result["files"][0]["name"] = "changed"
+        result["files"].append({"name": "extra"})
+        result["directories"].clear()
         
-        assert not source_path.exists()
-        assert dest_path.exists()
-        assert dest_path.read_text() == content
+        again = fm.list_files()
+        assert [f["name"] for f in again["files"]] == ["a.txt"]
+        assert [d["name"] for d in again["directories"]] == ["sub"]
     
-    def test_copy_file(self):
-        """测试文件复制。"""
-        # 先创建文件
-        content = "Content to copy"
-        self.file_manager.create_file("original.txt", content)
+    def test_list_files_concurrent_with_mutations(self, fm):
+        """测试并发列出目录与修改操作时缓存的失效不会与读写冲突。"""
+        errors = []
         
-        # 复制文件
-        result = self.file_manager.copy_file("original.txt", "copy.txt")
+        def worker(index):
+            try:
+                for i in range(200):
+                    fm.create_file(f"w{index}_{i % 5}.txt", "x")
+                    fm.list_files()
+            except Exception as e:  # 任何异常都说明缓存读写出现竞争
+                errors.append(e)
         
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        assert errors == []
+        assert fm.list_files()["total_files"] == 20
+    
+    def test_batch_apply(self, fm):
+        """测试批量执行文件操作。"""
+        results = fm.batch_apply([
+            ("create_file", {"path": "a.txt", "content": "hello"}),
+            ("read_file", {"path": "a.txt"}),
+            ("read_file", {"path": "missing.txt"}),
+            ("read_file", {"bogus": "a.txt"}),
+            ("_create_backup", {"file_path": "a.txt"}),
+        ])
+        
+        assert len(results) == 5
+        assert results[0]["success"] is True
+        assert results[1]["content"] == "hello"
+        assert results[2]["success"] is False
+        assert results[3]["success"] is False
+        assert "Unsupported operation" in results[4]["message"]
+    
+    @pytest.mark.asyncio(loop_scope="session")
+    async def test_async_operations(self, fm, workspace):
+        """测试异步文件操作和并发批量执行。"""
+        result = await fm.acreate_file("async.txt", "hello")
         assert result["success"] is True
         
-        # 验证两个文件都存在且内容相同
-        original_path = self.workspace / "original.txt"
-        copy_path = self.workspace / "copy.txt"
+        result = await fm.awrite_file("async.txt", " world", append=True)
+        assert result["size"] == len("hello world")
+        
+        result = await fm.aread_file("async.txt")
+        assert result["content"] == "hello world"
         
-        assert original_path.exists()
-        assert copy_path.exists()
-        assert original_path.read_text() == copy_path.read_text() == content
+        results = await fm.abatch([
+            ("create_file", {"path": f"batch_{i}.txt", "content": str(i)}) for i in range(5)
+        ] + [("rm_rf", {})])
+        assert [r["success"] for r in results] == [True] * 5 + [False]
+        assert (workspace / "batch_3.txt").read_bytes() == b"3"
     
-    def test_create_directory(self):
-        """测试目录创建。"""
-        result = self.file_manager.create_directory("test_dir")
+    def test_read_many(self, fm, workspace):
+        """测试批量读取文件。"""
+        (workspace / "one.txt").write_text("第一行\n")
+        (workspace / "crlf.txt").write_bytes(b"a\r\nb\r\n")
         
-        assert result["success"] is True
+        results = fm.read_many(["one.txt", "crlf.txt", "missing.txt"])
         
-        # 验证目录被创建
-        dir_path = self.workspace / "test_dir"
-        assert dir_path.exists()
-        assert dir_path.is_dir()
+        assert results[0]["content"] == "第一行\n"
+        assert results[0]["size"] == len("第一行\n".encode("utf-8"))
+        assert results[1]["content"] == fm.read_file("crlf.txt")["content"]
+        assert results[2]["success"] is False
+        assert results[2]["message"] == "File not found: missing.txt"
     
-    def test_list_files(self):
-        """测试文件列表。"""
-        # 创建一些测试文件和目录
-        self.file_manager.create_file("file1.txt", "content1")
-        self.file_manager.create_file("file2.py", "content2")
-        self.file_manager.create_directory("subdir")
+    def test_read_large_file(self, fm, workspace):
+        """测试大文件读取：内容与换行符转换和普通文本读取一致。"""
+        # 2 MiB 走内存映射，8 MiB 走 O_DIRECT
+        for repeat in (1 << 17, 1 << 19):
+            data = "大文件\r\nline\r" * repeat
+            (workspace / "large.txt").write_bytes(data.encode("utf-8"))
+            
+            result = fm.read_file("large.txt")
+            
+            assert result["success"] is True
+            assert result["content"] == data.replace("\r\n", "\n").replace("\r", "\n")
+            assert result["size"] == len(data.encode("utf-8"))
+    
+    def test_helper_caching(self):
+        """测试模块级辅助函数的缓存：备份时间戳按秒缓存，读取路径上的函数不缓存文件内容。"""
+        assert file_manager._backup_timestamp.cache_info().maxsize == 1
+        assert file_manager._compile_glob.cache_info().maxsize == 64
+        for helper in (file_manager._translate_newlines, file_manager._read_direct,
+                       file_manager._read_mapped):
+            assert not hasattr(helper, "cache_info")
+    
+    @pytest.mark.parametrize("fm", [True], indirect=True)
+    def test_move_across_devices_keeps_backup(self, fm, workspace, tmp_path, monkeypatch):
+        """测试 rename 报 EXDEV 时退回复制：目标被整体替换，硬链接备份仍是旧内容。"""
+        fm.create_file("a.txt", "NEW")
+        fm.create_file("b.txt", "OLD-PRECIOUS")
+        src_file = str(workspace / "a.txt")
+        real_replace = os.replace
+        
+        def replace(src, dst):
+            # 只让源文件的 rename 失败，模拟同一文件系统的两个绑定挂载点
+            if os.fspath(src) == src_file:
+                raise OSError(errno.EXDEV, os.strerror(errno.EXDEV))
+            real_replace(src, dst)
         
-        # 列出文件
-        result = self.file_manager.list_files()
+        monkeypatch.setattr(os, "replace", replace)
+        result = fm.move_file("a.txt", "b.txt")
         
         assert result["success"] is True
-        assert result["total_files"] == 2
-        assert result["total_directories"] == 1
+        assert (workspace / "b.txt").read_text() == "NEW"
+        assert sorted(p.name for p in workspace.iterdir()) == ["b.txt"]
+        backups = list((tmp_path / "backups").glob("b.txt.*.bak"))
+        assert len(backups) == 1
+        assert backups[0].read_text() == "OLD-PRECIOUS"
+    
+    @pytest.mark.parametrize("fm", [True], indirect=True)
+    def test_backups_never_reuse_existing_paths(self, fm, workspace, tmp_path, monkeypatch):
+        """测试同名备份已存在（包括与文件共享数据的硬链接）时换用新文件名，已有备份和原文件不被截断。"""
+        monkeypatch.setattr(file_manager, "_backup_timestamp", lambda second: "20260101_000000")
+        backups = tmp_path / "backups"
+        backups.mkdir()
+        fm.create_file("a.txt", "NEW")
+        fm.create_file("b.txt", "OLD")
+        # 之前失败的替换留下的、与 b.txt 共享数据的硬链接备份
+        os.link(workspace / "b.txt", backups / "b.txt.20260101_000000.bak")
         
-        # 检查文件名
-        file_names = [f["name"] for f in result["files"]]
-        assert "file1.txt" in file_names
-        assert "file2.py" in file_names
+        fm.write_file("a.txt", "v2")
+        fm.write_file("a.txt", "v3")
+        result = fm.copy_file("a.txt", "b.txt")
         
-        # 检查目录名
-        dir_names = [d["name"] for d in result["directories"]]
-        assert "subdir" in dir_names
+        assert result["success"] is True
+        assert (workspace / "b.txt").read_text() == "v3"
+        # 残留的硬链接仍与 b.txt 共享数据，它之前的内容由新的备份保存
+        assert os.path.samefile(workspace / "b.txt", backups / "b.txt.20260101_000000.bak")
+        assert {p.name: p.read_text() for p in backups.iterdir()} == {
+            "a.txt.20260101_000000.bak": "NEW",
+            "a.txt.20260101_000000.1.bak": "v2",
+            "b.txt.20260101_000000.bak": "v3",
+            "b.txt.20260101_000000.1.bak": "OLD",
+        }
     
-    def test_list_files_with_pattern(self):
-        """测试带模式的文件列表。"""
-        # 创建不同类型的文件
-        self.file_manager.create_file("test1.txt", "content")
-        self.file_manager.create_file("test2.py", "content")
-        self.file_manager.create_file("readme.md", "content")
+    @pytest.mark.parametrize("fm", [True], indirect=True)
+    def test_failed_replace_discards_linked_backup(self, fm, workspace, tmp_path, monkeypatch):
+        """测试替换失败时丢弃与原文件共享数据的硬链接备份，原文件保持不变。"""
+        fm.create_file("a.txt", "OLD")
         
-        # 只列出.txt文件
-        result = self.file_manager.list_files(pattern="*.txt")
+        def replace(src, dst):
+            raise PermissionError(errno.EACCES, os.strerror(errno.EACCES))
+        
+        monkeypatch.setattr(os, "replace", replace)
+        result = fm.write_file("a.txt", "NEW")
+        
+        assert result["success"] is False
+        assert (workspace / "a.txt").read_text() == "OLD"
+        assert list((tmp_path / "backups").iterdir()) == []
+        assert sorted(p.name for p in workspace.iterdir()) == ["a.txt"]
+    
+    @pytest.mark.parametrize("fm", [True], indirect=True)
+    def test_overwrite_replaces_file_and_keeps_backup(self, fm, workspace, tmp_path):
+        """测试覆盖写入：整体替换原文件，备份保留旧内容，权限位不变。"""
+        file_path = workspace / "script.sh"
+        fm.create_file("script.sh", "v1")
+        os.chmod(file_path, 0o755)
+        old_inode = file_path.stat().st_ino
+        
+        result = fm.write_file("script.sh", "v2")
         
         assert result["success"] is True
-        assert result["total_files"] == 1
-        assert result["files"][0]["name"] == "test1.txt"
+        assert file_path.read_bytes() == b"v2"
+        assert file_path.stat().st_ino != old_inode
+        assert file_path.stat().st_mode & 0o777 == 0o755
+        
+        backups = list((tmp_path / "backups").glob("script.sh.*.bak"))
+        assert len(backups) == 1
+        assert backups[0].read_bytes() == b"v1"
+        # 工作目录中不残留临时文件
+        assert sorted(p.name for p in workspace.iterdir()) == ["script.sh"]